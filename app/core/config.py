@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from typing import List
+from functools import cached_property, lru_cache
 import os
 
 class Settings(BaseSettings):
@@ -14,16 +15,24 @@ class Settings(BaseSettings):
     
     # Gemini AI
     GEMINI_API_KEY: str = ""
+    # Optional model to try before the built-in fallback list
+    GEMINI_MODEL: str = ""
     
     # Application
     DEBUG: bool = False
     CORS_ORIGINS: str = "http://localhost:3000"
     
-    @property
+    @cached_property
     def cors_origins_list(self) -> List[str]:
+        # Kept as a comma-separated string: pydantic-settings would JSON-decode a List[str] env var
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
     
     class Config:
         env_file = ".env"
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """Get the cached application settings"""
+    return Settings()
+
+settings = get_settings()
@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+import asyncio
+import os
+
+T = TypeVar("T")
+
+# Dedicated pool for blocking Google Cloud SDK calls, sized like the SDKs' own connection pools,
+# so storage uploads and bulk writes can't starve the default executor used by the framework
+MAX_BLOCKING_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+blocking_executor = ThreadPoolExecutor(max_workers=MAX_BLOCKING_WORKERS, thread_name_prefix="gcloud")
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking SDK call on the dedicated pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, partial(func, *args, **kwargs))
+
+def shutdown_blocking_executor():
+    """Wait for in-flight blocking calls and stop the pool"""
+    blocking_executor.shutdown(wait=True)
@@ -0,0 +1,12 @@
+import httpx
+
+# Shared client so outbound calls reuse pooled keep-alive connections
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=200),
+    timeout=httpx.Timeout(30.0)
+)
+
+async def close_http_client():
+    """Close the shared HTTP client and its pooled connections"""
+    await http_client.aclose()
@@ -0,0 +1,9 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Reads memoized for the current request and the background tasks it queues; None outside a request
+request_reads: ContextVar[Optional[Dict[tuple, Any]]] = ContextVar("request_reads", default=None)
+
+async def request_scope() -> None:
+    """Dependency giving each request an empty read memo; async so it sets the variable in the request's own context"""
+    request_reads.set({})
@@ -0,0 +1,66 @@
+from fastapi import Request, Response
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterable, Union
+import msgpack
+import orjson
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+# Paged list endpoints accept ?limit= up to this size and return the next cursor in this header
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Marks an empty listing in prefetch_rows
+_NO_ROWS = object()
+
+class MsgPackResponse(Response):
+    """Binary response for clients that send Accept: application/x-msgpack"""
+    media_type = MSGPACK_MEDIA_TYPE
+    
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content)
+
+def accepts_msgpack(request: Request) -> bool:
+    """Check whether the client asked for a MessagePack response"""
+    return MSGPACK_MEDIA_TYPE in request.headers.get("accept", "")
+
+def _orjson_default(value: Any) -> Any:
+    """Encode values orjson does not handle natively"""
+    # Firestore returns timestamps as a datetime subclass, which orjson rejects
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def _orjson_dumps(value: Any) -> bytes:
+    """Encode a value with orjson, accepting Firestore timestamps"""
+    return orjson.dumps(value, default=_orjson_default)
+
+async def prefetch_rows(rows: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Read the first row before the response starts, so a failing query still gets an error status"""
+    try:
+        first = await rows.__anext__()
+    except StopAsyncIteration:
+        first = _NO_ROWS
+    
+    async def chained() -> AsyncIterator[Any]:
+        if first is not _NO_ROWS:
+            yield first
+        async for row in rows:
+            yield row
+    
+    return chained()
+
+async def stream_json_array(rows: Union[Iterable[Any], AsyncIterable[Any]], encode: Callable[[Any], bytes] = _orjson_dumps) -> AsyncIterator[bytes]:
+    """Encode rows as a JSON array one row at a time for a StreamingResponse"""
+    yield b"["
+    if isinstance(rows, AsyncIterable):
+        index = 0
+        async for row in rows:
+            if index:
+                yield b","
+            yield encode(row)
+            index += 1
+    else:
+        for index, row in enumerate(rows):
+            if index:
+                yield b","
+            yield encode(row)
+    yield b"]"
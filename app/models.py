@@ -43,7 +43,7 @@ class VerificationResult(BaseModel):
     
     salary_match: bool
     salary_reason: Optional[str] = None
-    extracted_salary: Optional[int] = None
+    extracted_salary: Optional[float] = None
     
     employer_match: bool
     employer_reason: Optional[str] = None
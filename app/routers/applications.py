@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+from pydantic import BaseModel, TypeAdapter
+from datetime import datetime
 from app.models import LoanApplication, User, VerificationResult, Document
+from app.core.responses import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, MsgPackResponse, accepts_msgpack, prefetch_rows, stream_json_array
+from app.core.request_scope import request_scope
 from app.routers.auth import get_current_user
 from app.services.gemini_service import gemini_ocr
-from app.services.firestore_service import firestore_service
+from app.services.firestore_service import IN_QUERY_LIMIT, InvalidCursorError, VersionConflictError, firestore_service
+import asyncio
 import logging
 
-router = APIRouter()
+# Application and document reads are memoized per request, including the background verification it queues
+router = APIRouter(dependencies=[Depends(request_scope)])
 logger = logging.getLogger(__name__)
 
 # Pydantic models
@@ -22,6 +28,8 @@ class LoanApplicationUpdate(BaseModel):
     annual_salary: Optional[int] = None
     employer_name: Optional[str] = None
     ssn: Optional[str] = None
+    # Version the client last read; the update is rejected if the application has changed since
+    version: Optional[int] = None
 
 class LoanApplicationResponse(BaseModel):
     id: str
@@ -29,17 +37,105 @@ class LoanApplicationResponse(BaseModel):
     annual_salary: int
     employer_name: str
     ssn: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
     verification_status: Optional[str] = None
     user_id: Optional[str] = None
+    version: int = 0
+    # Read from the application's counters; None in lists for applications stored before the counters existed
+    document_count: Optional[int] = None
+    verification_count: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+# Stored fields needed to build a LoanApplicationResponse; id comes from the document key
+APPLICATION_FIELDS = [field for field in LoanApplicationResponse.model_fields if field != "id"]
+DOCUMENT_FIELDS = [field for field in Document.model_fields if field != "id"]
+
+# Serialize list responses straight to JSON bytes
+_application_adapter = TypeAdapter(LoanApplicationResponse)
+_application_list_adapter = TypeAdapter(List[LoanApplicationResponse])
+_document_list_adapter = TypeAdapter(List[Document])
+
+async def _get_verification_status(application: dict) -> str:
+    """Get the verification status stored on an application"""
+    if "verification_status" in application:
+        return application["verification_status"]
+    
+    # Applications verified before the status was stored on the document
+    latest_verification = await firestore_service.get_latest_verification(application["id"])
+    return latest_verification["overall_status"] if latest_verification else "no_documents"
+
+def _normalize_app(app: dict, verification_status: str, counts: Optional[dict] = None) -> LoanApplicationResponse:
+    """Build a response from a stored application without revalidating it"""
+    counts = counts or app
+    return LoanApplicationResponse.model_construct(
+        id=app["id"],
+        name=app["name"],
+        annual_salary=app["annual_salary"],
+        employer_name=app["employer_name"],
+        ssn=app["ssn"],
+        created_at=app["created_at"],
+        updated_at=app.get("updated_at"),
+        verification_status=verification_status,
+        user_id=app.get("user_id", "unknown"),  # Add user_id to track who created the application
+        version=app.get("version", 0),
+        document_count=counts.get("document_count"),
+        verification_count=counts.get("verification_count")
+    )
+
+def _build_application_rows(applications: List[dict], latest_verifications: dict) -> List[LoanApplicationResponse]:
+    """Build response rows for a list of applications and their latest verifications"""
+    return [
+        _normalize_app(
+            app,
+            app["verification_status"] if "verification_status" in app else latest_verifications.get(app["id"], {}).get("overall_status", "no_documents")
+        )
+        for app in applications
+    ]
+
+async def _resolve_application_rows(applications: List[dict]) -> List[LoanApplicationResponse]:
+    """Build response rows, looking up the latest verification for applications without a stored status"""
+    # Applications created before verification_status was stored need a lookup
+    legacy_ids = [app["id"] for app in applications if "verification_status" not in app]
+    latest_verifications = await firestore_service.get_latest_verifications_bulk(legacy_ids) if legacy_ids else {}
+    return _build_application_rows(applications, latest_verifications)
+
+async def _iter_application_rows(applications: AsyncIterator[dict]) -> AsyncIterator[LoanApplicationResponse]:
+    """Build response rows as applications arrive, one bulk status lookup per chunk"""
+    chunk = []
+    async for app in applications:
+        chunk.append(app)
+        if len(chunk) == IN_QUERY_LIMIT:
+            for row in await _resolve_application_rows(chunk):
+                yield row
+            chunk = []
+    if chunk:
+        for row in await _resolve_application_rows(chunk):
+            yield row
+
+def _build_document_rows(documents: List[dict]) -> List[Document]:
+    """Build response rows for a list of documents"""
+    return [
+        Document.model_construct(
+            id=doc["id"],
+            user_id=doc["user_id"],
+            application_id=doc["application_id"],
+            filename=doc["filename"],
+            gcp_url=doc["gcp_url"],
+            file_type=doc["file_type"],
+            file_size=doc["file_size"],
+            uploaded_at=doc["uploaded_at"]
+        )
+        for doc in documents
+    ]
+
 @router.post("/", response_model=LoanApplicationResponse)
 async def create_application(
     application: LoanApplicationCreate,
+    response: Response,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user)
 ):
     """Create a new loan application"""
@@ -50,34 +146,25 @@ async def create_application(
             "name": application.name,
             "annual_salary": application.annual_salary,
             "employer_name": application.employer_name,
-            "ssn": application.ssn
+            "ssn": application.ssn,
+            "verification_status": "no_documents"
         }
         
-        application_id = await firestore_service.create_application(application_data)
+        created_app = await firestore_service.create_application(application_data)
+        application_id = created_app["id"]
         
-        # Check if there are any documents to verify against
-        documents = await firestore_service.get_documents_by_application(application_id)
+        # Check if there are any documents to verify against; only their IDs are needed
+        documents = await firestore_service.get_documents_by_application(application_id, fields=[])
         
         if documents:
-            # Trigger verification for existing documents
-            await trigger_verification(application_id)
-        
-        # Get the created application
-        created_app = await firestore_service.get_application_by_id(application_id)
-        
-        return LoanApplicationResponse(
-            id=created_app["id"],
-            name=created_app["name"],
-            annual_salary=created_app["annual_salary"],
-            employer_name=created_app["employer_name"],
-            ssn=created_app["ssn"],
-            created_at=created_app["created_at"].isoformat(),
-            updated_at=created_app["updated_at"].isoformat() if created_app["updated_at"] else None,
-            verification_status="pending" if documents else "no_documents"
-        )
+            # Verify existing documents after the response is sent
+            background_tasks.add_task(trigger_verification, application_id)
+            response.status_code = status.HTTP_202_ACCEPTED
+        
+        return _normalize_app(created_app, "pending" if documents else "no_documents")
         
     except Exception as e:
-        logger.error(f"Error creating application: {e}")
+        logger.error("Error creating application: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create application"
@@ -85,35 +172,43 @@ async def create_application(
 
 @router.get("/", response_model=List[LoanApplicationResponse])
 async def get_applications(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get all applications from all users"""
+    """Get all applications from all users, optionally one page at a time"""
     try:
-        applications = await firestore_service.get_all_applications()
-        
-        result = []
-        for app in applications:
-            # Get latest verification status
-            latest_verification = await firestore_service.get_latest_verification(app["id"])
-            
-            verification_status = latest_verification["overall_status"] if latest_verification else "no_documents"
-            
-            result.append(LoanApplicationResponse(
-                id=app["id"],
-                name=app["name"],
-                annual_salary=app["annual_salary"],
-                employer_name=app["employer_name"],
-                ssn=app["ssn"],
-                created_at=app["created_at"].isoformat(),
-                updated_at=app["updated_at"].isoformat() if app["updated_at"] else None,
-                verification_status=verification_status,
-                user_id=app.get("user_id", "unknown")  # Add user_id to track who created the application
-            ))
-        
-        return result
+        rows = _iter_application_rows(
+            firestore_service.iter_all_applications(fields=APPLICATION_FIELDS, limit=limit, cursor=cursor)
+        )
+        
+        headers = {}
+        # A page is bounded by limit, so it is buffered to find the cursor before the headers go out;
+        # MessagePack arrays carry their length up front, so that path always buffers
+        if limit or accepts_msgpack(request):
+            rows = [row async for row in rows]
+            if limit and len(rows) == limit:
+                headers[NEXT_CURSOR_HEADER] = rows[-1].id
+        else:
+            # Errors after the first rows can only abort the stream, so at least the query's start is checked up front
+            rows = await prefetch_rows(rows)
+        
+        if accepts_msgpack(request):
+            return MsgPackResponse(_application_list_adapter.dump_python(rows, mode="json"), headers=headers)
+        return StreamingResponse(
+            stream_json_array(rows, encode=_application_adapter.dump_json),
+            media_type="application/json",
+            headers=headers
+        )
         
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     except Exception as e:
-        logger.error(f"Error getting applications: {e}")
+        logger.error("Error getting applications: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get applications"
@@ -136,26 +231,17 @@ async def get_application(
         
         # Note: Anyone can view any application (global access)
         
-        # Get latest verification status
-        latest_verification = await firestore_service.get_latest_verification(application_id)
-        
-        verification_status = latest_verification["overall_status"] if latest_verification else "no_documents"
-        
-        return LoanApplicationResponse(
-            id=application["id"],
-            name=application["name"],
-            annual_salary=application["annual_salary"],
-            employer_name=application["employer_name"],
-            ssn=application["ssn"],
-            created_at=application["created_at"].isoformat(),
-            updated_at=application["updated_at"].isoformat() if application["updated_at"] else None,
-            verification_status=verification_status
+        verification_status, counts = await asyncio.gather(
+            _get_verification_status(application),
+            firestore_service.get_application_counts(application)
         )
         
+        return _normalize_app(application, verification_status, counts)
+        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting application: {e}")
+        logger.error("Error getting application: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get application"
@@ -165,52 +251,47 @@ async def get_application(
 async def update_application(
     application_id: str,
     application_update: LoanApplicationUpdate,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user)
 ):
     """Update an existing application"""
     try:
-        application = await firestore_service.get_application_by_id(application_id)
+        # Note: Anyone can update any application (global access)
         
-        if not application:
+        # Update fields
+        update_data = application_update.model_dump(exclude_unset=True)
+        expected_version = update_data.pop("version", None)
+        
+        if update_data:
+            updated_app = await firestore_service.update_application(application_id, update_data, expected_version)
+        else:
+            updated_app = await firestore_service.get_application_by_id(application_id)
+        
+        if not updated_app:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Application not found"
             )
         
-        # Note: Anyone can update any application (global access)
+        verification_status = await _get_verification_status(updated_app)
+        if update_data and verification_status != "no_documents":
+            # Store the pending status so polls of the status endpoint don't report the previous result meanwhile
+            await firestore_service.set_verification_status(application_id, "pending")
+            verification_status = "pending"
+            # Re-verify after the response is sent so the client doesn't wait for OCR
+            background_tasks.add_task(trigger_verification, application_id)
         
-        # Update fields
-        update_data = application_update.dict(exclude_unset=True)
-        
-        if update_data:
-            await firestore_service.update_application(application_id, update_data)
-            
-            # Trigger re-verification
-            await trigger_verification(application_id)
-        
-        # Get updated application
-        updated_app = await firestore_service.get_application_by_id(application_id)
-        
-        # Get latest verification status
-        latest_verification = await firestore_service.get_latest_verification(application_id)
-        
-        verification_status = latest_verification["overall_status"] if latest_verification else "no_documents"
-        
-        return LoanApplicationResponse(
-            id=updated_app["id"],
-            name=updated_app["name"],
-            annual_salary=updated_app["annual_salary"],
-            employer_name=updated_app["employer_name"],
-            ssn=updated_app["ssn"],
-            created_at=updated_app["created_at"].isoformat(),
-            updated_at=updated_app["updated_at"].isoformat() if updated_app["updated_at"] else None,
-            verification_status=verification_status
-        )
+        return _normalize_app(updated_app, verification_status)
         
     except HTTPException:
         raise
+    except VersionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
     except Exception as e:
-        logger.error(f"Error updating application: {e}")
+        logger.error("Error updating application: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update application"
@@ -233,11 +314,12 @@ async def delete_application(
         
         # Note: Anyone can delete any application (global access)
         
-        # Delete associated documents
-        await firestore_service.delete_documents_by_application(application_id)
-        
-        # Delete associated verifications
-        await firestore_service.delete_verifications_by_application(application_id)
+        # Delete associated documents and verifications concurrently; the loaded application's counters
+        # let either cleanup skip its query when there is nothing to delete
+        await asyncio.gather(
+            firestore_service.delete_documents_by_application(application_id, application),
+            firestore_service.delete_verifications_by_application(application_id, application)
+        )
         
         # Delete application
         await firestore_service.delete_application(application_id)
@@ -247,7 +329,7 @@ async def delete_application(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting application: {e}")
+        logger.error("Error deleting application: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete application"
@@ -260,8 +342,11 @@ async def get_application_documents(
 ):
     """Get all documents for a specific application"""
     try:
-        # Verify application belongs to user
-        application = await firestore_service.get_application_by_id(application_id)
+        # Fetch the application and its documents concurrently
+        application, documents = await asyncio.gather(
+            firestore_service.get_application_by_id(application_id),
+            firestore_service.get_documents_by_application(application_id, fields=DOCUMENT_FIELDS)
+        )
         
         if not application:
             raise HTTPException(
@@ -271,70 +356,71 @@ async def get_application_documents(
         
         # Note: Anyone can view documents for any application (global access)
         
-        # Get documents for this application
-        documents = await firestore_service.get_documents_by_application(application_id)
-        
-        return [
-            Document(
-                id=doc["id"],
-                user_id=doc["user_id"],
-                application_id=doc["application_id"],
-                filename=doc["filename"],
-                gcp_url=doc["gcp_url"],
-                file_type=doc["file_type"],
-                file_size=doc["file_size"],
-                uploaded_at=doc["uploaded_at"]
-            )
-            for doc in documents
-        ]
+        rows = _build_document_rows(documents)
+        return Response(content=_document_list_adapter.dump_json(rows), media_type="application/json")
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting application documents: {e}")
+        logger.error("Error getting application documents: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get application documents"
         )
 
+async def _store_verification(document: dict, extracted_data: dict, verification_results: dict, application_id: str):
+    """Store a single document's verification result"""
+    verification_data = {
+        "application_id": application_id,
+        "document_id": document["id"],
+        "extracted_data": extracted_data,
+        **verification_results
+    }
+    
+    await firestore_service.create_verification(verification_data)
+
 async def trigger_verification(application_id: str):
     """Trigger verification for an application"""
     try:
-        # Get application
-        application = await firestore_service.get_application_by_id(application_id)
+        # Get application and associated documents concurrently
+        application, documents = await asyncio.gather(
+            firestore_service.get_application_by_id(application_id),
+            firestore_service.get_documents_by_application(application_id, fields=["gcp_url"])
+        )
         
         if not application:
             return
         
-        # Get associated documents
-        documents = await firestore_service.get_documents_by_application(application_id)
-        
-        for document in documents:
-            # Extract data using Gemini OCR
-            extracted_data = await gemini_ocr.extract_paystub_data(document["gcp_url"])
-            
-            # Verify application data
-            application_data = {
-                "name": application["name"],
-                "annual_salary": application["annual_salary"],
-                "employer_name": application["employer_name"],
-                "ssn": application["ssn"]
-            }
-            
-            verification_results = await gemini_ocr.verify_application_data(
-                application_data, extracted_data
-            )
-            
-            # Create verification result
-            verification_data = {
-                "application_id": application_id,
-                "document_id": document["id"],
-                "extracted_data": extracted_data,
-                **verification_results
-            }
-            
-            await firestore_service.create_verification(verification_data)
+        application_data = {
+            "name": application["name"],
+            "annual_salary": application["annual_salary"],
+            "employer_name": application["employer_name"],
+            "ssn": application["ssn"]
+        }
+        
+        # Extract data from every document in as few Gemini requests as possible
+        extracted = await gemini_ocr.extract_paystub_data_batch([document["gcp_url"] for document in documents])
+        
+        # Verify every document in one pass, then store the results concurrently; a document whose
+        # extraction failed is stored as an "error" result, which also sets the application's status
+        verifications = await gemini_ocr.verify_application_data_batch(application_data, extracted)
+        results = await asyncio.gather(
+            *(
+                _store_verification(document, {} if isinstance(extracted_data, Exception) else extracted_data, verification_results, application_id)
+                for document, extracted_data, verification_results in zip(documents, extracted, verifications)
+            ),
+            return_exceptions=True
+        )
+        
+        failed = False
+        for document, result in zip(documents, results):
+            if isinstance(result, Exception):
+                logger.error("Error verifying document %s: %s", document['id'], result)
+                failed = True
+        if failed:
+            await firestore_service.set_verification_status(application_id, "error")
         
     except Exception as e:
-        logger.error(f"Error in trigger_verification: {e}")
-        # Don't raise exception to avoid breaking the main operation
\ No newline at end of file
+        logger.error("Error in trigger_verification: %s", e)
+        # Runs as a background task, so record the failure for clients polling the status
+        await firestore_service.set_verification_status(application_id, "error")
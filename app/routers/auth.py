@@ -1,18 +1,38 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from cachetools import TTLCache
 from app.models import User
 from app.services.auth_service import clerk_auth
 from app.services.firestore_service import firestore_service
+import hashlib
 import logging
+import time
 
 router = APIRouter()
 security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
+# Authenticated users keyed by token digest, so repeat requests skip token
+# verification and the Firestore user lookup
+_user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+def _token_cache_key(token: str) -> bytes:
+    """Build a short cache key for a bearer token"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> User:
     """Get current authenticated user"""
+    cache_key = _token_cache_key(credentials.credentials)
+    cached = _user_cache.get(cache_key)
+    if cached:
+        user, expires_at = cached
+        if not expires_at or time.time() <= expires_at:
+            return user
+        # Token expired since it was cached; fall through so verification rejects it
+        _user_cache.pop(cache_key, None)
+    
     try:
         # Verify token with Clerk
         token_data = await clerk_auth.verify_token(credentials.credentials)
@@ -40,12 +60,14 @@ async def get_current_user(
             user_id = await firestore_service.create_user(user_data)
             user_data["id"] = user_id
         
-        return User(**user_data)
+        user = User(**user_data)
+        _user_cache[cache_key] = (user, token_data.get("expires_at"))
+        return user
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error in get_current_user: {e}")
+        logger.error("Error in get_current_user: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Authentication failed"
@@ -1,16 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from typing import List, Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Optional
+from pydantic import BaseModel, TypeAdapter
+from datetime import datetime
 from app.models import Document, LoanApplication, User, VerificationResult
+from app.core.responses import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, MsgPackResponse, accepts_msgpack, prefetch_rows, stream_json_array
+from app.core.request_scope import request_scope
 from app.routers.auth import get_current_user
 from app.services.gcp_service import gcp_service
 from app.services.gemini_service import gemini_ocr
-from app.services.firestore_service import firestore_service
+from app.services.firestore_service import InvalidCursorError, firestore_service
+import asyncio
 import logging
+import os
 
-router = APIRouter()
+# Application and document reads are memoized per request, including the background verification it queues
+router = APIRouter(dependencies=[Depends(request_scope)])
 logger = logging.getLogger(__name__)
 
+ALLOWED_CONTENT_TYPE_PREFIXES = ("image/", "application/pdf")
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
 # Pydantic models
 class DocumentResponse(BaseModel):
     id: str
@@ -18,7 +28,7 @@ class DocumentResponse(BaseModel):
     gcp_url: str
     file_type: str
     file_size: int
-    uploaded_at: str
+    uploaded_at: datetime
     application_id: Optional[str] = None
     
     class Config:
@@ -29,8 +39,34 @@ class DocumentUploadResponse(BaseModel):
     verification_status: str
     message: str
 
+# Stored fields needed to build a DocumentResponse; id comes from the document key
+DOCUMENT_FIELDS = [field for field in DocumentResponse.model_fields if field != "id"]
+
+# Serialize list responses straight to JSON bytes
+_document_adapter = TypeAdapter(DocumentResponse)
+_document_list_adapter = TypeAdapter(List[DocumentResponse])
+
+def _to_document_response(doc: dict) -> DocumentResponse:
+    """Build a response from a stored document without revalidating it"""
+    return DocumentResponse.model_construct(
+        id=doc["id"],
+        filename=doc["filename"],
+        gcp_url=doc["gcp_url"],
+        file_type=doc["file_type"],
+        file_size=doc["file_size"],
+        uploaded_at=doc["uploaded_at"],
+        application_id=doc.get("application_id")
+    )
+
+async def _iter_document_rows(documents: AsyncIterator[dict]) -> AsyncIterator[DocumentResponse]:
+    """Build response rows as documents arrive"""
+    async for doc in documents:
+        yield _to_document_response(doc)
+
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(
+    response: Response,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     application_id: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user)
@@ -38,24 +74,25 @@ async def upload_document(
     """Upload a document (pay stub)"""
     try:
         # Validate file type (support images and PDFs)
-        allowed_types = ['image/', 'application/pdf']
-        if not any(file.content_type.startswith(t) for t in allowed_types):
+        if not (file.content_type or "").startswith(ALLOWED_CONTENT_TYPE_PREFIXES):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Only image files (JPG, PNG, GIF) and PDF files are allowed"
             )
         
-        # Validate file size (max 10MB)
-        file_content = await file.read()
-        if len(file_content) > 10 * 1024 * 1024:
+        # Validate file size (max 10MB) from the spooled upload without reading it
+        file.file.seek(0, os.SEEK_END)
+        file_size = file.file.tell()
+        file.file.seek(0)
+        if file_size > MAX_UPLOAD_SIZE:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
                 detail="File size too large. Maximum 10MB allowed."
             )
         
         # Upload to GCP
-        gcp_url = await gcp_service.upload_file(
-            file_content, file.filename, file.content_type
+        gcp_url = await gcp_service.upload_file_stream(
+            file.file, file.filename, file.content_type, file_size
         )
         
         # Save document to Firestore
@@ -65,48 +102,33 @@ async def upload_document(
             "filename": file.filename,
             "gcp_url": gcp_url,
             "file_type": file.content_type,
-            "file_size": len(file_content)
+            "file_size": file_size
         }
         
-        document_id = await firestore_service.create_document(document_data)
+        created_doc = await firestore_service.create_document(document_data)
+        document_id = created_doc["id"]
         
         verification_status = "pending"
         message = "Document uploaded successfully"
         
         # If application_id is provided, trigger verification
         if application_id:
-            logger.info(f"Processing document upload for application_id: {application_id}")
-            # Verify application exists and belongs to user
-            application = await firestore_service.get_application_by_id(application_id)
-            
-            if application:
-                logger.info(f"Application found, linking document {document_id} to application {application_id}")
-                # Update document with application_id
-                await firestore_service.update_document(document_id, {"application_id": application_id})
-                
-                logger.info(f"Triggering verification for application {application_id} with document {document_id}")
-                # Trigger verification
-                await trigger_verification(application_id, document_id)
-                verification_status = "completed"
-                message = "Document uploaded and verification completed"
+            logger.info("Processing document upload for application_id: %s", application_id)
+            # Marking the application pending also checks that it exists, so it isn't read separately
+            if await firestore_service.set_verification_status(application_id, "pending"):
+                # The document was stored with application_id already set, so no separate link write is needed
+                logger.info("Queueing verification for application %s with document %s", application_id, document_id)
+                # Verify after the response is sent; clients poll the verification status
+                background_tasks.add_task(trigger_verification, application_id, document_id)
+                response.status_code = status.HTTP_202_ACCEPTED
+                message = "Document uploaded and verification started"
             else:
-                logger.error(f"Application not found or access denied for application_id: {application_id}")
+                logger.error("Application not found or access denied for application_id: %s", application_id)
                 verification_status = "error"
                 message = "Document uploaded but application not found or access denied"
         
-        # Get the created document
-        created_doc = await firestore_service.get_document_by_id(document_id)
-        
         return DocumentUploadResponse(
-            document=DocumentResponse(
-                id=created_doc["id"],
-                filename=created_doc["filename"],
-                gcp_url=created_doc["gcp_url"],
-                file_type=created_doc["file_type"],
-                file_size=created_doc["file_size"],
-                uploaded_at=created_doc["uploaded_at"].isoformat(),
-                application_id=created_doc["application_id"]
-            ),
+            document=_to_document_response(created_doc),
             verification_status=verification_status,
             message=message
         )
@@ -114,7 +136,7 @@ async def upload_document(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error uploading document: {e}")
+        logger.error("Error uploading document: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to upload document"
@@ -122,27 +144,41 @@ async def upload_document(
 
 @router.get("/", response_model=List[DocumentResponse])
 async def get_documents(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
-    """Get all documents from all users"""
+    """Get all documents from all users, optionally one page at a time"""
     try:
-        documents = await firestore_service.get_all_documents()
-        
-        return [
-            DocumentResponse(
-                id=doc["id"],
-                filename=doc["filename"],
-                gcp_url=doc["gcp_url"],
-                file_type=doc["file_type"],
-                file_size=doc["file_size"],
-                uploaded_at=doc["uploaded_at"].isoformat(),
-                application_id=doc["application_id"]
-            )
-            for doc in documents
-        ]
+        rows = _iter_document_rows(firestore_service.iter_all_documents(fields=DOCUMENT_FIELDS, limit=limit, cursor=cursor))
+        
+        headers = {}
+        # A page is bounded by limit, so it is buffered to find the cursor before the headers go out;
+        # MessagePack arrays carry their length up front, so that path always buffers
+        if limit or accepts_msgpack(request):
+            rows = [row async for row in rows]
+            if limit and len(rows) == limit:
+                headers[NEXT_CURSOR_HEADER] = rows[-1].id
+        else:
+            # Errors after the first rows can only abort the stream, so at least the query's start is checked up front
+            rows = await prefetch_rows(rows)
+        
+        if accepts_msgpack(request):
+            return MsgPackResponse(_document_list_adapter.dump_python(rows, mode="json"), headers=headers)
+        return StreamingResponse(
+            stream_json_array(rows, encode=_document_adapter.dump_json),
+            media_type="application/json",
+            headers=headers
+        )
         
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     except Exception as e:
-        logger.error(f"Error getting documents: {e}")
+        logger.error("Error getting documents: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get documents"
@@ -165,20 +201,12 @@ async def get_document(
         
         # Note: Anyone can access any document (global access)
         
-        return DocumentResponse(
-            id=document["id"],
-            filename=document["filename"],
-            gcp_url=document["gcp_url"],
-            file_type=document["file_type"],
-            file_size=document["file_size"],
-            uploaded_at=document["uploaded_at"].isoformat(),
-            application_id=document["application_id"]
-        )
+        return _to_document_response(document)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting document: {e}")
+        logger.error("Error getting document: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get document"
@@ -215,7 +243,7 @@ async def delete_document(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting document: {e}")
+        logger.error("Error deleting document: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete document"
@@ -224,13 +252,17 @@ async def delete_document(
 @router.post("/{document_id}/link-application")
 async def link_document_to_application(
     document_id: str,
+    background_tasks: BackgroundTasks,
     application_id: str = Form(...),
     current_user: User = Depends(get_current_user)
 ):
     """Link a document to an application and trigger verification"""
     try:
-        # Verify document belongs to user
-        document = await firestore_service.get_document_by_id(document_id)
+        # Fetch the document and application concurrently
+        document, application = await asyncio.gather(
+            firestore_service.get_document_by_id(document_id),
+            firestore_service.get_application_by_id(application_id)
+        )
         
         if not document:
             raise HTTPException(
@@ -240,9 +272,6 @@ async def link_document_to_application(
         
         # Note: Anyone can link any document to any application (global access)
         
-        # Verify application belongs to user
-        application = await firestore_service.get_application_by_id(application_id)
-        
         if not application:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -254,15 +283,16 @@ async def link_document_to_application(
         # Link document to application
         await firestore_service.update_document(document_id, {"application_id": application_id})
         
-        # Trigger verification
-        await trigger_verification(application_id, document_id)
+        # Verify after the response is sent
+        await firestore_service.set_verification_status(application_id, "pending")
+        background_tasks.add_task(trigger_verification, application_id, document_id)
         
         return {"message": "Document linked to application and verification triggered"}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error linking document: {e}")
+        logger.error("Error linking document: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to link document"
@@ -271,25 +301,25 @@ async def link_document_to_application(
 async def trigger_verification(application_id: str, document_id: str):
     """Trigger verification for a specific application and document"""
     try:
-        logger.info(f"Starting verification for application {application_id} and document {document_id}")
-        # Get application
-        application = await firestore_service.get_application_by_id(application_id)
+        logger.info("Starting verification for application %s and document %s", application_id, document_id)
+        # Get application and document concurrently
+        application, document = await asyncio.gather(
+            firestore_service.get_application_by_id(application_id),
+            firestore_service.get_document_by_id(document_id)
+        )
         
         if not application:
-            logger.error(f"Application {application_id} not found")
+            logger.error("Application %s not found", application_id)
             return
         
-        # Get document
-        document = await firestore_service.get_document_by_id(document_id)
-        
         if not document:
-            logger.error(f"Document {document_id} not found")
+            logger.error("Document %s not found", document_id)
             return
         
         # Extract data using Gemini OCR
-        logger.info(f"Extracting data from document URL: {document['gcp_url']}")
+        logger.info("Extracting data from document URL: %s", document['gcp_url'])
         extracted_data = await gemini_ocr.extract_paystub_data(document["gcp_url"])
-        logger.info(f"Extracted data: {extracted_data}")
+        logger.info("Extracted data: %s", extracted_data)
         
         # Verify application data
         application_data = {
@@ -299,11 +329,11 @@ async def trigger_verification(application_id: str, document_id: str):
             "ssn": application["ssn"]
         }
         
-        logger.info(f"Verifying application data: {application_data}")
+        logger.info("Verifying application data: %s", application_data)
         verification_results = await gemini_ocr.verify_application_data(
             application_data, extracted_data
         )
-        logger.info(f"Verification results: {verification_results}")
+        logger.info("Verification results: %s", verification_results)
         
         # Create verification result
         verification_data = {
@@ -313,10 +343,11 @@ async def trigger_verification(application_id: str, document_id: str):
             **verification_results
         }
         
-        logger.info(f"Creating verification with data: {verification_data}")
+        logger.info("Creating verification with data: %s", verification_data)
         verification_id = await firestore_service.create_verification(verification_data)
-        logger.info(f"Verification created with ID: {verification_id}")
+        logger.info("Verification created with ID: %s", verification_id)
         
     except Exception as e:
-        logger.error(f"Error in trigger_verification: {e}")
-        # Don't raise exception to avoid breaking the main operation
\ No newline at end of file
+        logger.error("Error in trigger_verification: %s", e)
+        # Runs as a background task, so record the failure for clients polling the status
+        await firestore_service.set_verification_status(application_id, "error")
\ No newline at end of file
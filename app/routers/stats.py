@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from typing import Dict, Any
 from app.routers.auth import get_current_user
-from app.services.firestore_service import FirestoreService
+from app.services.firestore_service import firestore_service
 from app.models import User
+import logging
 
 router = APIRouter(tags=["stats"])
+logger = logging.getLogger(__name__)
 
 @router.get("/global")
 async def get_global_stats(current_user: User = Depends(get_current_user)):
@@ -12,18 +13,14 @@ async def get_global_stats(current_user: User = Depends(get_current_user)):
     Get global statistics for all applications in the database
     """
     try:
-        firestore_service = FirestoreService()
-        
-        # Get all applications from the database
-        all_applications = await firestore_service.get_all_applications()
-        
-        # Calculate statistics
-        total_applications = len(all_applications)
-        verified_count = len([app for app in all_applications if app.get('verification_status') == 'verified'])
-        mismatch_count = len([app for app in all_applications if app.get('verification_status') == 'mismatch'])
-        pending_count = len([app for app in all_applications if app.get('verification_status') == 'pending'])
-        error_count = len([app for app in all_applications if app.get('verification_status') == 'error'])
-        no_documents_count = len([app for app in all_applications if app.get('verification_status') == 'no_documents'])
+        # Count applications per status with aggregation queries (cached briefly by the service)
+        status_counts = await firestore_service.get_application_status_counts()
+        total_applications = status_counts['total']
+        verified_count = status_counts['verified']
+        mismatch_count = status_counts['mismatch']
+        pending_count = status_counts['pending']
+        error_count = status_counts['error']
+        no_documents_count = status_counts['no_documents']
         
         # Calculate verification rate
         verified_rate = (verified_count / total_applications * 100) if total_applications > 0 else 0
@@ -41,5 +38,5 @@ async def get_global_stats(current_user: User = Depends(get_current_user)):
         return stats
         
     except Exception as e:
-        print(f"Error fetching global stats: {e}")
+        logger.error("Error fetching global stats: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch global statistics")
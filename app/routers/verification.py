@@ -1,18 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from datetime import datetime
 from app.models import VerificationResult, LoanApplication, User
+from app.core.responses import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, stream_json_array
+from app.core.request_scope import request_scope
 from app.routers.auth import get_current_user
-from app.services.firestore_service import firestore_service
+from app.services.firestore_service import InvalidCursorError, firestore_service
 from app.services.gemini_service import gemini_ocr
 import logging
-import json
+import orjson
 import asyncio
 
-router = APIRouter()
+# Application and document reads are memoized per request, including the background verification it queues
+router = APIRouter(dependencies=[Depends(request_scope)])
 logger = logging.getLogger(__name__)
 
+def _sse_frame(payload: dict) -> bytes:
+    """Encode a payload as a server-sent event frame"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+# Progress frames that never change are encoded once at import
+_FRAME_NO_DOCUMENTS = _sse_frame({'step': 'error', 'message': 'No documents found for verification', 'progress': 0, 'error': True})
+_FRAME_STARTING = _sse_frame({'step': 'starting', 'message': 'Starting verification process...', 'progress': 0})
+_FRAME_DOWNLOADING = _sse_frame({'step': 'downloading', 'message': 'Downloading document from storage...', 'progress': 20})
+_FRAME_OCR = _sse_frame({'step': 'ocr', 'message': 'Extracting data using AI OCR...', 'progress': 40})
+_FRAME_EXTRACTING = _sse_frame({'step': 'extracting', 'message': 'Analyzing document with AI...', 'progress': 50})
+_FRAME_VERIFYING_NAME = _sse_frame({'step': 'verifying_name', 'message': 'Verifying name match...', 'progress': 70})
+_FRAME_VERIFYING_SALARY = _sse_frame({'step': 'verifying_salary', 'message': 'Verifying salary match...', 'progress': 80})
+_FRAME_VERIFYING_EMPLOYER = _sse_frame({'step': 'verifying_employer', 'message': 'Verifying employer match...', 'progress': 90})
+_FRAME_FINALIZING = _sse_frame({'step': 'finalizing', 'message': 'Finalizing verification results...', 'progress': 95})
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Headers": "*",
+}
+
 # Pydantic models
 class VerificationResponse(BaseModel):
     id: str
@@ -23,7 +49,7 @@ class VerificationResponse(BaseModel):
     name_reason: str
     salary_match: bool
     salary_reason: str
-    extracted_salary: Optional[int]
+    extracted_salary: Optional[float]
     employer_match: bool
     employer_reason: str
     extracted_employer: Optional[str]
@@ -31,11 +57,43 @@ class VerificationResponse(BaseModel):
     ssn_reason: str
     extracted_ssn: Optional[str]
     overall_status: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
+        extra = "ignore"
+        frozen = True
+    
+    @classmethod
+    def from_firestore(cls, verification: dict) -> "VerificationResponse":
+        """Build a response from a stored verification without revalidating it"""
+        return cls.model_construct(**_verification_row(verification))
+
+# Stored fields needed to build a VerificationResponse; id comes from the document key
+VERIFICATION_FIELDS = [field for field in VerificationResponse.model_fields if field != "id"]
+
+# Encode rows with pydantic-core directly rather than through per-instance Python dispatch
+_verification_adapter = TypeAdapter(VerificationResponse)
+
+def _verification_row(verification: dict) -> dict:
+    """Pick the response fields from a stored verification"""
+    return {field: verification.get(field) for field in VerificationResponse.model_fields}
+
+def _verification_page(verifications: List[dict], limit: Optional[int]) -> StreamingResponse:
+    """Stream a page of verifications, pointing to the next page when this one is full"""
+    headers = {}
+    if limit and len(verifications) == limit:
+        headers[NEXT_CURSOR_HEADER] = verifications[-1]["id"]
+    # Rows are encoded as they are written, so the whole JSON body is never held in memory
+    return StreamingResponse(
+        stream_json_array(
+            (VerificationResponse.from_firestore(verification) for verification in verifications),
+            encode=_verification_adapter.dump_json
+        ),
+        media_type="application/json",
+        headers=headers
+    )
 
 class VerificationSummary(BaseModel):
     application_id: str
@@ -45,14 +103,18 @@ class VerificationSummary(BaseModel):
     mismatched_fields: int
     verification_details: VerificationResponse
 
+_summary_adapter = TypeAdapter(VerificationSummary)
+
 @router.get("/application/{application_id}", response_model=List[VerificationResponse])
 async def get_verification_results(
     application_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get verification results for a specific application"""
     try:
-        # Verify application belongs to user
+        # Check the application first, so a missing one is a 404 whatever the cursor or query outcome
         application = await firestore_service.get_application_by_id(application_id)
         
         if not application:
@@ -63,37 +125,20 @@ async def get_verification_results(
         
         # Note: Anyone can access verification for any application (global access)
         
-        # Get verification results
-        verifications = await firestore_service.get_verifications_by_application(application_id)
-        
-        return [
-            VerificationResponse(
-                id=verification["id"],
-                application_id=verification["application_id"],
-                document_id=verification["document_id"],
-                extracted_data=verification["extracted_data"],
-                name_match=verification["name_match"],
-                name_reason=verification["name_reason"],
-                salary_match=verification["salary_match"],
-                salary_reason=verification["salary_reason"],
-                extracted_salary=verification["extracted_salary"],
-                employer_match=verification["employer_match"],
-                employer_reason=verification["employer_reason"],
-                extracted_employer=verification["extracted_employer"],
-                ssn_match=verification["ssn_match"],
-                ssn_reason=verification["ssn_reason"],
-                extracted_ssn=verification["extracted_ssn"],
-                overall_status=verification["overall_status"],
-                created_at=verification["created_at"].isoformat(),
-                updated_at=verification["updated_at"].isoformat() if verification["updated_at"] else None
-            )
-            for verification in verifications
-        ]
+        verifications = await firestore_service.get_verifications_by_application(
+            application_id, limit, cursor, fields=VERIFICATION_FIELDS
+        )
+        return _verification_page(verifications, limit)
         
     except HTTPException:
         raise
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     except Exception as e:
-        logger.error(f"Error getting verification results: {e}")
+        logger.error("Error getting verification results: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get verification results"
@@ -106,8 +151,11 @@ async def get_latest_verification(
 ):
     """Get the latest verification result for an application"""
     try:
-        # Verify application belongs to user
-        application = await firestore_service.get_application_by_id(application_id)
+        # Fetch the application and its latest verification result concurrently
+        application, verification = await asyncio.gather(
+            firestore_service.get_application_by_id(application_id),
+            firestore_service.get_latest_verification(application_id)
+        )
         
         if not application:
             raise HTTPException(
@@ -117,9 +165,6 @@ async def get_latest_verification(
         
         # Note: Anyone can access verification for any application (global access)
         
-        # Get latest verification result
-        verification = await firestore_service.get_latest_verification(application_id)
-        
         if not verification:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -127,38 +172,19 @@ async def get_latest_verification(
             )
         
         # Calculate summary
-        matched_fields = sum([
-            verification["name_match"],
-            verification["salary_match"],
-            verification["employer_match"],
-            verification["ssn_match"]
-        ])
+        matched_fields = (
+            verification["name_match"]
+            + verification["salary_match"]
+            + verification["employer_match"]
+            + verification["ssn_match"]
+        )
         
         total_fields = 4
         mismatched_fields = total_fields - matched_fields
         
-        verification_response = VerificationResponse(
-            id=verification["id"],
-            application_id=verification["application_id"],
-            document_id=verification["document_id"],
-            extracted_data=verification["extracted_data"],
-            name_match=verification["name_match"],
-            name_reason=verification["name_reason"],
-            salary_match=verification["salary_match"],
-            salary_reason=verification["salary_reason"],
-            extracted_salary=verification["extracted_salary"],
-            employer_match=verification["employer_match"],
-            employer_reason=verification["employer_reason"],
-            extracted_employer=verification["extracted_employer"],
-            ssn_match=verification["ssn_match"],
-            ssn_reason=verification["ssn_reason"],
-            extracted_ssn=verification["extracted_ssn"],
-            overall_status=verification["overall_status"],
-            created_at=verification["created_at"].isoformat(),
-            updated_at=verification["updated_at"].isoformat() if verification["updated_at"] else None
-        )
+        verification_response = VerificationResponse.from_firestore(verification)
         
-        return VerificationSummary(
+        summary = VerificationSummary.model_construct(
             application_id=application_id,
             overall_status=verification["overall_status"],
             total_fields=total_fields,
@@ -166,11 +192,13 @@ async def get_latest_verification(
             mismatched_fields=mismatched_fields,
             verification_details=verification_response
         )
+        # Encode straight to JSON bytes, skipping the response_model revalidation of the nested result
+        return Response(content=_summary_adapter.dump_json(summary), media_type="application/json")
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting latest verification: {e}")
+        logger.error("Error getting latest verification: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get verification results"
@@ -194,25 +222,32 @@ async def get_verification_status(
         
         # Note: Anyone can access verification for any application (global access)
         
-        # Get latest verification
-        verification = await firestore_service.get_latest_verification(application_id)
+        if "verification_status" in application:
+            # Status is kept on the application by create_verification
+            verification_status = application["verification_status"]
+            last_updated = application.get("verification_updated_at")
+        else:
+            # Applications verified before the status was stored on the document
+            verification = await firestore_service.get_latest_verification(application_id)
+            verification_status = verification["overall_status"] if verification else "no_documents"
+            last_updated = (verification["updated_at"] or verification["created_at"]) if verification else None
         
-        if not verification:
+        if verification_status == "no_documents":
             return {
                 "status": "no_documents",
                 "message": "No documents uploaded for verification"
             }
         
         return {
-            "status": verification["overall_status"],
-            "message": f"Verification {verification['overall_status']}",
-            "last_updated": verification["updated_at"].isoformat() if verification["updated_at"] else verification["created_at"].isoformat()
+            "status": verification_status,
+            "message": f"Verification {verification_status}",
+            "last_updated": last_updated
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting verification status: {e}")
+        logger.error("Error getting verification status: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get verification status"
@@ -220,39 +255,26 @@ async def get_verification_status(
 
 @router.get("/", response_model=List[VerificationResponse])
 async def get_all_verifications(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get all verification results for current user"""
     try:
         # Get all verifications for user's applications
-        verifications = await firestore_service.get_all_verifications_by_user(current_user.id)
+        verifications = await firestore_service.get_all_verifications_by_user(
+            current_user.id, limit, cursor, fields=VERIFICATION_FIELDS
+        )
         
-        return [
-            VerificationResponse(
-                id=verification["id"],
-                application_id=verification["application_id"],
-                document_id=verification["document_id"],
-                extracted_data=verification["extracted_data"],
-                name_match=verification["name_match"],
-                name_reason=verification["name_reason"],
-                salary_match=verification["salary_match"],
-                salary_reason=verification["salary_reason"],
-                extracted_salary=verification["extracted_salary"],
-                employer_match=verification["employer_match"],
-                employer_reason=verification["employer_reason"],
-                extracted_employer=verification["extracted_employer"],
-                ssn_match=verification["ssn_match"],
-                ssn_reason=verification["ssn_reason"],
-                extracted_ssn=verification["extracted_ssn"],
-                overall_status=verification["overall_status"],
-                created_at=verification["created_at"].isoformat(),
-                updated_at=verification["updated_at"].isoformat() if verification["updated_at"] else None
-            )
-            for verification in verifications
-        ]
+        return _verification_page(verifications, limit)
         
+    except InvalidCursorError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     except Exception as e:
-        logger.error(f"Error getting all verifications: {e}")
+        logger.error("Error getting all verifications: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get verification results"
@@ -265,8 +287,11 @@ async def live_verification_stream(
 ):
     """Live verification stream with real-time updates"""
     try:
-        # Verify application belongs to user
-        application = await firestore_service.get_application_by_id(application_id)
+        # Fetch the application and its documents concurrently
+        application, documents = await asyncio.gather(
+            firestore_service.get_application_by_id(application_id),
+            firestore_service.get_documents_by_application(application_id, fields=["gcp_url"])
+        )
         
         if not application:
             raise HTTPException(
@@ -276,23 +301,15 @@ async def live_verification_stream(
         
         # Note: Anyone can access verification for any application (global access)
         
-        # Get documents for this application
-        documents = await firestore_service.get_documents_by_application(application_id)
-        
         if not documents:
             # Return a proper error response instead of raising an exception
             async def generate_error_stream():
-                yield f"data: {json.dumps({'step': 'error', 'message': 'No documents found for verification', 'progress': 0, 'error': True})}\n\n"
+                yield _FRAME_NO_DOCUMENTS
             
             return StreamingResponse(
                 generate_error_stream(),
-                media_type="text/plain",
-                headers={
-                    "Cache-Control": "no-cache",
-                    "Connection": "keep-alive",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Headers": "*",
-                }
+                media_type="text/event-stream",
+                headers=SSE_HEADERS
             )
         
         # Use the latest document
@@ -301,35 +318,35 @@ async def live_verification_stream(
         async def generate_verification_stream():
             try:
                 # Step 1: Starting verification
-                yield f"data: {json.dumps({'step': 'starting', 'message': 'Starting verification process...', 'progress': 0})}\n\n"
+                yield _FRAME_STARTING
                 
                 # Step 2: Downloading document
-                yield f"data: {json.dumps({'step': 'downloading', 'message': 'Downloading document from storage...', 'progress': 20})}\n\n"
+                yield _FRAME_DOWNLOADING
                 
                 # Step 3: Processing with OCR
-                yield f"data: {json.dumps({'step': 'ocr', 'message': 'Extracting data using AI OCR...', 'progress': 40})}\n\n"
+                yield _FRAME_OCR
                 
                 # Step 4: Extract data using Gemini (this is the actual work)
-                yield f"data: {json.dumps({'step': 'extracting', 'message': 'Analyzing document with AI...', 'progress': 50})}\n\n"
+                yield _FRAME_EXTRACTING
                 try:
                     extracted_data = await gemini_ocr.extract_paystub_data(document["gcp_url"])
-                    yield f"data: {json.dumps({'step': 'extracted', 'message': 'Data extracted successfully', 'progress': 60, 'extracted_data': extracted_data})}\n\n"
+                    yield _sse_frame({'step': 'extracted', 'message': 'Data extracted successfully', 'progress': 60, 'extracted_data': extracted_data})
                 except Exception as e:
-                    logger.error(f"OCR extraction failed: {e}")
-                    yield f"data: {json.dumps({'step': 'error', 'message': f'OCR extraction failed: {str(e)}', 'progress': 0, 'error': True})}\n\n"
+                    logger.error("OCR extraction failed: %s", e, exc_info=True)
+                    yield _sse_frame({'step': 'error', 'message': f'OCR extraction failed: {str(e)}', 'progress': 0, 'error': True})
                     return
                 
                 # Step 5: Verifying name
-                yield f"data: {json.dumps({'step': 'verifying_name', 'message': 'Verifying name match...', 'progress': 70})}\n\n"
+                yield _FRAME_VERIFYING_NAME
                 
                 # Step 6: Verifying salary
-                yield f"data: {json.dumps({'step': 'verifying_salary', 'message': 'Verifying salary match...', 'progress': 80})}\n\n"
+                yield _FRAME_VERIFYING_SALARY
                 
                 # Step 7: Verifying employer
-                yield f"data: {json.dumps({'step': 'verifying_employer', 'message': 'Verifying employer match...', 'progress': 90})}\n\n"
+                yield _FRAME_VERIFYING_EMPLOYER
                 
                 # Step 8: Final verification (this is the actual work)
-                yield f"data: {json.dumps({'step': 'finalizing', 'message': 'Finalizing verification results...', 'progress': 95})}\n\n"
+                yield _FRAME_FINALIZING
                 try:
                     application_data = {
                         "name": application["name"],
@@ -352,32 +369,27 @@ async def live_verification_stream(
                     
                     verification_id = await firestore_service.create_verification(verification_data)
                 except Exception as e:
-                    logger.error(f"Verification process failed: {e}")
-                    yield f"data: {json.dumps({'step': 'error', 'message': f'Verification process failed: {str(e)}', 'progress': 0, 'error': True})}\n\n"
+                    logger.error("Verification process failed: %s", e, exc_info=True)
+                    yield _sse_frame({'step': 'error', 'message': f'Verification process failed: {str(e)}', 'progress': 0, 'error': True})
                     return
                 
                 # Step 9: Complete
-                yield f"data: {json.dumps({'step': 'complete', 'message': 'Verification completed', 'progress': 100, 'verification_results': verification_results, 'verification_id': verification_id})}\n\n"
+                yield _sse_frame({'step': 'complete', 'message': 'Verification completed', 'progress': 100, 'verification_results': verification_results, 'verification_id': verification_id})
                 
             except Exception as e:
-                logger.error(f"Error in verification stream: {e}")
-                yield f"data: {json.dumps({'step': 'error', 'message': f'Verification failed: {str(e)}', 'progress': 0, 'error': True})}\n\n"
+                logger.error("Error in verification stream: %s", e, exc_info=True)
+                yield _sse_frame({'step': 'error', 'message': f'Verification failed: {str(e)}', 'progress': 0, 'error': True})
         
         return StreamingResponse(
             generate_verification_stream(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*",
-            }
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error starting live verification: {e}")
+        logger.error("Error starting live verification: %s", e, exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to start live verification"
@@ -1,62 +1,89 @@
 import httpx
+import hashlib
+import jwt
+import time
+from cachetools import TLRUCache
 from fastapi import HTTPException, status
 from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.http import http_client
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Clerk lookups sit on the auth path, so fail fast instead of using the shared 30s timeout
+CLERK_TIMEOUT = 5.0
+# How long the fetched JWKS is trusted before it is refetched
+JWKS_CACHE_TTL = 3600
+# Verified tokens are re-checked against Clerk keys at least this often
+TOKEN_CACHE_TTL = 300
+
+def _token_expiry(key: bytes, token_data: dict, now: float) -> float:
+    """Keep a verified token cached until it expires"""
+    return min(token_data["expires_at"], now + TOKEN_CACHE_TTL)
+
 class ClerkAuthService:
     def __init__(self):
         self.secret_key = settings.CLERK_SECRET_KEY
         self.base_url = "https://api.clerk.com/v1"
+        self.headers = {
+            "Authorization": f"Bearer {self.secret_key}",
+            "Content-Type": "application/json"
+        }
+        # Clerk's signing keys, fetched once and refreshed when an unknown kid shows up
+        self._jwks_client = jwt.PyJWKClient(
+            f"{self.base_url}/jwks",
+            cache_keys=True,
+            lifespan=JWKS_CACHE_TTL,
+            headers={"Authorization": f"Bearer {self.secret_key}"}
+        )
+        # Verified token payloads keyed by token digest
+        self._token_cache = TLRUCache(maxsize=10_000, ttu=_token_expiry, timer=time.time)
     
     async def verify_token(self, token: str) -> dict:
         """Verify JWT token with Clerk"""
+        cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        cached = self._token_cache.get(cache_key)
+        if cached and time.time() <= cached["expires_at"]:
+            return cached
+        
         try:
-            # For now, let's use a simpler approach - decode the JWT without verification
-            # This is for development purposes. In production, you should verify the signature
-            import jwt
-            import json
-            from datetime import datetime
-            
-            # Decode the token without verification to get the payload
-            # In production, you should verify the signature using Clerk's public keys
             try:
-                payload = jwt.decode(token, options={"verify_signature": False})
-                
-                # Check if token is expired
-                exp = payload.get('exp')
-                if exp and datetime.utcnow().timestamp() > exp:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="Token has expired"
-                    )
-                
-                # Extract user information
-                user_id = payload.get('sub')
-                if not user_id:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="Invalid token format"
-                    )
-                
-                return {
-                    "user_id": user_id,
-                    "session_id": payload.get('sid'),
-                    "expires_at": exp
-                }
-                
-            except jwt.InvalidTokenError as e:
-                logger.error(f"Invalid JWT token: {e}")
+                # Select the signing key by the token's kid; the JWKS is cached by the client
+                signing_key = await run_blocking(self._jwks_client.get_signing_key_from_jwt, token)
+                payload = jwt.decode(
+                    token,
+                    signing_key.key,
+                    algorithms=["RS256"],
+                    options={"require": ["exp", "sub"]}
+                )
+            except jwt.PyJWKClientConnectionError:
+                # Clerk unreachable, not a bad token
+                raise
+            except jwt.ExpiredSignatureError:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Token has expired"
+                )
+            except (jwt.InvalidTokenError, jwt.PyJWKClientError) as e:
+                logger.error("Invalid JWT token: %s", e)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid token"
                 )
+            
+            token_data = {
+                "user_id": payload['sub'],
+                "session_id": payload.get('sid'),
+                "expires_at": payload['exp']
+            }
+            self._token_cache[cache_key] = token_data
+            return token_data
                     
         except HTTPException:
             raise
         except Exception as e:
-            logger.error(f"Error verifying token: {e}")
+            logger.error("Error verifying token: %s", e, exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Authentication service unavailable"
@@ -65,26 +92,23 @@ class ClerkAuthService:
     async def get_user_info(self, user_id: str) -> dict:
         """Get user information from Clerk"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/users/{user_id}",
-                    headers={
-                        "Authorization": f"Bearer {self.secret_key}",
-                        "Content-Type": "application/json"
-                    }
-                )
-                
-                if response.status_code == 200:
-                    return response.json()
-                else:
-                    # If we can't get user info from Clerk, return a basic structure
-                    logger.warning(f"Could not get user info from Clerk: {response.status_code}")
-                    return {
-                        "id": user_id,
-                        "email_addresses": [{"email_address": f"user_{user_id}@example.com"}]
-                    }
+            response = await http_client.get(
+                f"{self.base_url}/users/{user_id}",
+                headers=self.headers,
+                timeout=CLERK_TIMEOUT
+            )
+            
+            if response.status_code == 200:
+                return response.json()
+            else:
+                # If we can't get user info from Clerk, return a basic structure
+                logger.warning("Could not get user info from Clerk: %s", response.status_code)
+                return {
+                    "id": user_id,
+                    "email_addresses": [{"email_address": f"user_{user_id}@example.com"}]
+                }
         except httpx.RequestError as e:
-            logger.error(f"Error getting user info from Clerk: {e}")
+            logger.error("Error getting user info from Clerk: %s", e)
             # Return a basic structure if Clerk is unavailable
             return {
                 "id": user_id,
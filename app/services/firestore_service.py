@@ -1,328 +1,978 @@
+from google.api_core.exceptions import NotFound
 from google.cloud import firestore
+from google.cloud.firestore import FieldFilter
+from cachetools import TTLCache
 from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.request_scope import request_reads
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import random
+import time
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Any
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+class FirestoreServiceError(Exception):
+    """Raised when a Firestore write or aggregation fails"""
+
+class VersionConflictError(FirestoreServiceError):
+    """Raised when an update expects a different version than the one stored"""
+
+class InvalidCursorError(FirestoreServiceError):
+    """Raised when a pagination cursor does not name an existing document"""
+
+DESCENDING = firestore.Query.DESCENDING
+
+# Firestore caps the number of values in an 'in' filter
+IN_QUERY_LIMIT = 30
+# How long user lookups are served from memory; applications and documents change, so they are served from
+# snapshot listeners instead, which Firestore keeps current with every worker's writes
+READ_CACHE_TTL = 30
+READ_CACHE_SIZE = 4096
+# Verification statuses reported by the global stats
+APPLICATION_STATUSES = ('verified', 'mismatch', 'pending', 'error', 'no_documents')
+# How long the global status counts are served from memory
+STATS_CACHE_TTL = 30
+# Every application create, delete and status change increments the status counters, so they are spread
+# over this many shard documents ('global' and 'global-1'...) to stay under Firestore's per-document write rate
+STATS_SHARDS = 10
+STATS_SHARD_IDS = ('global',) + tuple(f'global-{shard}' for shard in range(1, STATS_SHARDS))
+# Writes queued while a batch commit is in flight are coalesced into the next batch, which starts once that
+# commit finishes or as soon as this many are queued
+WRITE_FLUSH_SIZE = 400
+# Firestore RPCs in flight at once per process, well under the streams a gRPC channel allows
+MAX_CONCURRENT_RPCS = 64
+# Read applications, documents and latest verifications are kept current with snapshot listeners, up to this
+# many in total, each torn down after this long without a read
+LISTENER_LIMIT = 100
+LISTENER_IDLE_TTL = 30 * 60
+# Per-application counters kept on the application document; a missing counter means unknown
+APPLICATION_COUNTERS = ('document_count', 'verification_count')
+
 class FirestoreService:
     def __init__(self):
-        self.db = firestore.Client(project=settings.GCP_PROJECT_ID)
-        self.collections = {
-            'users': 'users',
-            'applications': 'loan_applications',
-            'documents': 'documents',
-            'verifications': 'verification_results'
-        }
-    
-    def get_collection(self, collection_name: str):
-        """Get a Firestore collection reference"""
-        return self.db.collection(self.collections[collection_name])
+        self.db = firestore.AsyncClient(project=settings.GCP_PROJECT_ID)
+        self.users_col = self.db.collection('users')
+        self.apps_col = self.db.collection('loan_applications')
+        self.docs_col = self.db.collection('documents')
+        self.vers_col = self.db.collection('verification_results')
+        self.stats_col = self.db.collection('stats')
+        # Read-through cache for user lookups, which are written once and never updated
+        self._user_cache = TTLCache(maxsize=READ_CACHE_SIZE, ttl=READ_CACHE_TTL)
+        # Loads in flight per cache key, so concurrent misses share one Firestore read
+        self._inflight_reads: Dict[tuple, asyncio.Future] = {}
+        # Status counts are shared by every caller; the lock collapses concurrent refreshes into one
+        self._stats_cache = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL)
+        self._stats_lock = asyncio.Lock()
+        # Writes waiting for the next shared batch commit, with the future each caller awaits
+        self._pending_writes: List[tuple] = []
+        self._pending_write_count = 0
+        self._commit_tasks: set = set()
+        # Bounds concurrent Firestore RPCs so request fan-out can't exhaust the channel's streams;
+        # iter_* listings don't hold a slot, since they stay open while the client reads the response
+        self._rpc_slots = asyncio.Semaphore(MAX_CONCURRENT_RPCS)
+        # Snapshot listeners need the sync client, created on first use; keyed by (kind, ID), least recently read first
+        self._listener_db: Optional[firestore.Client] = None
+        self._listeners: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        # Unsubscribes run in the background, since each one joins the listener's thread
+        self._unsubscribe_tasks: set = set()
+    
+    async def warmup(self) -> None:
+        """Run a trivial read so the gRPC channel and credentials are ready before the first request"""
+        try:
+            await self.users_col.limit(1).get()
+        except Exception as e:
+            logger.error("Error warming up Firestore client: %s", e)
+    
+    def _stats_ref(self):
+        """Get a random shard of the denormalized global status counters"""
+        return self.stats_col.document(random.choice(STATS_SHARD_IDS))
+    
+    def _stats_shard_refs(self) -> list:
+        """Get every shard of the global status counters; the first one records whether they were backfilled"""
+        return [self.stats_col.document(shard_id) for shard_id in STATS_SHARD_IDS]
+    
+    def _update_status_counters(self, writer, old_status: Optional[str], new_status: Optional[str], total_delta: int = 0):
+        """Queue increments of the global status counters on a batch or transaction"""
+        counts = {}
+        if old_status != new_status:
+            if old_status in APPLICATION_STATUSES:
+                counts[old_status] = firestore.Increment(-1)
+            if new_status in APPLICATION_STATUSES:
+                counts[new_status] = firestore.Increment(1)
+        
+        stats_update = {}
+        if counts:
+            stats_update['counts'] = counts
+        if total_delta:
+            stats_update['total'] = firestore.Increment(total_delta)
+        if stats_update:
+            writer.set(self._stats_ref(), stats_update, merge=True)
+    
+    async def _read_through(self, cache: TTLCache, key: str, load: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Serve a read from cache, sharing one Firestore load between concurrent misses"""
+        cached = cache.get(key)
+        if cached is not None:
+            return dict(cached)
+        
+        inflight_key = (id(cache), key)
+        load_task = self._inflight_reads.get(inflight_key)
+        if load_task is None:
+            load_task = asyncio.ensure_future(load())
+            self._inflight_reads[inflight_key] = load_task
+            load_task.add_done_callback(lambda _: self._inflight_reads.pop(inflight_key, None))
+        
+        # Shielded so one cancelled caller doesn't cancel the load for the others
+        data = await asyncio.shield(load_task)
+        if data is None:
+            return None
+        cache[key] = data
+        return dict(data)
+    
+    async def _fetch(self, query) -> List[Dict[str, Any]]:
+        """Run a query and return each document's data with its ID"""
+        async with self._rpc_slots:
+            result = []
+            async for snapshot in query.stream():
+                data = snapshot.to_dict()
+                data['id'] = snapshot.id
+                result.append(data)
+            return result
+    
+    async def _load_document(self, doc_ref) -> Optional[Dict[str, Any]]:
+        """Read a single document and return its data with the ID, or None if it does not exist"""
+        async with self._rpc_slots:
+            doc = await doc_ref.get()
+        if not doc.exists:
+            return None
+        data = doc.to_dict()
+        data['id'] = doc.id
+        return data
+    
+    async def _read_listened(self, key: tuple, target: Callable[[firestore.Client], Any], load: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Serve a read from the request's memo, or from its snapshot listener once synced, otherwise load it directly"""
+        memo = request_reads.get()
+        if memo is not None and key in memo:
+            value = memo[key]
+        else:
+            value = await self._read_from_listener(key, target, load)
+            if memo is not None:
+                memo[key] = value
+        return dict(value) if value else None
+    
+    def _remember_read(self, key: tuple, value: Dict[str, Any]):
+        """Put a document the service just wrote in the request's memo, so the request doesn't read it back"""
+        memo = request_reads.get()
+        if memo is not None:
+            memo[key] = dict(value)
+    
+    def _forget_reads(self, *keys: tuple):
+        """Drop reads a committed write made stale from the request's memo and stop their listeners"""
+        memo = request_reads.get()
+        if memo is not None:
+            for key in keys:
+                memo.pop(key, None)
+        self._stop_listeners(*keys)
+    
+    async def _read_from_listener(self, key: tuple, target: Callable[[firestore.Client], Any], load: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Serve a read from its snapshot listener once synced, otherwise start the listener and load it directly"""
+        entry = self._listeners.get(key)
+        if entry is not None:
+            entry['last_read'] = time.monotonic()
+            self._listeners.move_to_end(key)
+            if entry['synced']:
+                return entry['value']
+        else:
+            self._evict_listeners()
+            try:
+                if self._listener_db is None:
+                    self._listener_db = firestore.Client(project=settings.GCP_PROJECT_ID)
+                self._listen(key, target(self._listener_db))
+            except Exception as e:
+                logger.warning("Error starting snapshot listener for %s: %s", key, e)
+        
+        # Until the listener's first snapshot arrives, read directly
+        return await load()
+    
+    def _listen(self, key: tuple, target):
+        """Start keeping the single document a reference or limit(1) query watches in memory, updated by pushed deltas"""
+        loop = asyncio.get_running_loop()
+        entry = {'value': None, 'synced': False, 'last_read': time.monotonic(), 'watch': None}
+        
+        def on_snapshot(snapshots, changes, read_time):
+            # Runs on the listener's thread; hand the result to the event loop
+            value = None
+            if snapshots:
+                value = snapshots[0].to_dict()
+                value['id'] = snapshots[0].id
+            loop.call_soon_threadsafe(entry.update, {'value': value, 'synced': True})
+        
+        entry['watch'] = target.on_snapshot(on_snapshot)
+        self._listeners[key] = entry
+    
+    def _stop_listeners(self, *keys: tuple):
+        """Forget the given listeners and unsubscribe them in the background"""
+        watches = [self._listeners.pop(key)['watch'] for key in keys if key in self._listeners]
+        if watches:
+            # Keep a reference so the task isn't garbage collected mid-flight
+            task = asyncio.ensure_future(self._unsubscribe(watches))
+            self._unsubscribe_tasks.add(task)
+            task.add_done_callback(self._unsubscribe_tasks.discard)
+    
+    async def _unsubscribe(self, watches: List[Any]):
+        """Unsubscribe snapshot listeners, which joins each listener's thread"""
+        for watch in watches:
+            try:
+                await run_blocking(watch.unsubscribe)
+            except Exception as e:
+                logger.warning("Error stopping snapshot listener: %s", e)
+    
+    def _evict_listeners(self):
+        """Stop listeners idle past their TTL, and the least recently read ones beyond the limit"""
+        now = time.monotonic()
+        evicted = []
+        for key, entry in self._listeners.items():
+            if len(self._listeners) - len(evicted) < LISTENER_LIMIT and now - entry['last_read'] < LISTENER_IDLE_TTL:
+                break
+            evicted.append(key)
+        self._stop_listeners(*evicted)
+    
+    async def close_listeners(self):
+        """Stop every snapshot listener"""
+        self._stop_listeners(*list(self._listeners))
+        if self._unsubscribe_tasks:
+            await asyncio.gather(*self._unsubscribe_tasks)
+    
+    async def _load_user_by_clerk_id(self, clerk_user_id: str) -> Optional[Dict[str, Any]]:
+        """Query the user with a Clerk user ID"""
+        users = await self._fetch(self.users_col.where(filter=FieldFilter('clerk_user_id', '==', clerk_user_id)).limit(1))
+        return users[0] if users else None
+    
+    async def _queue_writes(self, *writes: Callable) -> datetime:
+        """Queue writes for the next shared batch commit, wait until it is committed and return the commit time"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending_writes.append((writes, future))
+        self._pending_write_count += len(writes)
+        
+        # With no commit in flight there is nothing to wait for, so an uncontended write commits right away
+        if not self._commit_tasks or self._pending_write_count >= WRITE_FLUSH_SIZE:
+            self._flush_writes()
+        return await future
+    
+    def _flush_writes(self):
+        """Start committing every queued write in a single batch"""
+        pending, self._pending_writes = self._pending_writes, []
+        self._pending_write_count = 0
+        if pending:
+            # Keep a reference so the commit task isn't garbage collected mid-flight
+            task = asyncio.ensure_future(self._commit_writes(pending))
+            self._commit_tasks.add(task)
+            task.add_done_callback(self._on_commit_done)
+    
+    def _on_commit_done(self, task: asyncio.Task):
+        """Start the next batch with the writes queued while a commit was in flight"""
+        self._commit_tasks.discard(task)
+        if not self._commit_tasks:
+            self._flush_writes()
+    
+    async def _commit_batch(self, pending: List[tuple]) -> datetime:
+        """Commit the writes of the given callers in one batch and return the commit time"""
+        batch = self.db.batch()
+        for writes, _ in pending:
+            for write in writes:
+                write(batch)
+        async with self._rpc_slots:
+            await batch.commit()
+        return batch.commit_time
+    
+    async def _commit_writes(self, pending: List[tuple]):
+        """Commit a group of queued writes and resolve their callers"""
+        try:
+            commit_time = await self._commit_batch(pending)
+        except Exception as e:
+            if len(pending) == 1:
+                _, future = pending[0]
+                if not future.done():
+                    future.set_exception(e)
+                return
+            # A batch is all-or-nothing, so one bad write would fail every caller sharing it;
+            # retry each caller's writes in its own batch so only the bad ones fail
+            logger.warning("Shared batch of %d writes failed, retrying them separately: %s", len(pending), e)
+            await asyncio.gather(*(self._commit_writes([entry]) for entry in pending))
+            return
+        for _, future in pending:
+            if not future.done():
+                future.set_result(commit_time)
+    
+    async def _bulk_delete(self, query, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Delete every document matched by a query and return the given fields of each deleted one with its ID"""
+        # Only the document keys and requested fields are needed, so skip transferring the rest
+        bulk_writer = self.db.bulk_writer()
+        deleted = []
+        async with self._rpc_slots:
+            async for snapshot in query.select(fields or []).stream():
+                bulk_writer.delete(snapshot.reference)
+                deleted.append({**(snapshot.to_dict() or {}), 'id': snapshot.id})
+        # BulkWriter sends from its own threads; closing blocks until the pipelined deletes finish
+        await run_blocking(bulk_writer.close)
+        return deleted
+    
+    async def _existing_applications(self, transaction, *application_ids: Optional[str]) -> set:
+        """Read applications in a transaction and return the IDs of those that exist, whose counters can be updated"""
+        refs = [self.apps_col.document(application_id) for application_id in set(application_ids) if application_id]
+        if not refs:
+            return set()
+        return {snapshot.id async for snapshot in self.db.get_all(refs, transaction=transaction) if snapshot.exists}
+    
+    def _adjust_counter(self, transaction, existing: set, application_id: Optional[str], counter: str, delta: int):
+        """Increment one of an application's counters in a transaction, ignoring applications that do not exist"""
+        if application_id in existing:
+            transaction.update(self.apps_col.document(application_id), {counter: firestore.Increment(delta)})
+    
+    def _counter_is_zero(self, application: Optional[Dict[str, Any]], counter: str) -> bool:
+        """Whether an already loaded application's counter shows it has nothing to clean up"""
+        return application is not None and application.get(counter) == 0
     
     # User operations
     async def create_user(self, user_data: Dict[str, Any]) -> str:
         """Create a new user document"""
         try:
-            doc_ref = self.get_collection('users').document()
-            user_data['created_at'] = datetime.utcnow()
-            user_data['updated_at'] = datetime.utcnow()
-            doc_ref.set(user_data)
+            doc_ref = self.users_col.document()
+            user_data['created_at'] = firestore.SERVER_TIMESTAMP
+            user_data['updated_at'] = firestore.SERVER_TIMESTAMP
+            commit_time = await self._queue_writes(lambda batch: batch.set(doc_ref, user_data))
+            # The server stamps the commit time, so mirror it locally instead of reading the user back
+            user_data['created_at'] = user_data['updated_at'] = commit_time
             return doc_ref.id
         except Exception as e:
-            logger.error(f"Error creating user: {e}")
-            raise Exception(f"Failed to create user: {str(e)}")
+            logger.error("Error creating user: %s", e)
+            raise FirestoreServiceError("Failed to create user") from e
     
     async def get_user_by_clerk_id(self, clerk_user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by Clerk user ID"""
         try:
-            users = self.get_collection('users').where('clerk_user_id', '==', clerk_user_id).limit(1).stream()
-            for user in users:
-                user_data = user.to_dict()
-                user_data['id'] = user.id
-                return user_data
-            return None
+            return await self._read_through(
+                self._user_cache, f"clerk:{clerk_user_id}",
+                lambda: self._load_user_by_clerk_id(clerk_user_id)
+            )
         except Exception as e:
-            logger.error(f"Error getting user by clerk ID: {e}")
+            logger.error("Error getting user by clerk ID: %s", e)
             return None
     
     async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by document ID"""
         try:
-            doc_ref = self.get_collection('users').document(user_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                user_data = doc.to_dict()
-                user_data['id'] = doc.id
-                return user_data
-            return None
+            doc_ref = self.users_col.document(user_id)
+            return await self._read_through(self._user_cache, f"id:{user_id}", lambda: self._load_document(doc_ref))
         except Exception as e:
-            logger.error(f"Error getting user by ID: {e}")
+            logger.error("Error getting user by ID: %s", e)
             return None
     
     # Application operations
-    async def create_application(self, application_data: Dict[str, Any]) -> str:
-        """Create a new loan application"""
+    async def create_application(self, application_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new loan application and return the stored document"""
         try:
-            doc_ref = self.get_collection('applications').document()
-            application_data['created_at'] = datetime.utcnow()
-            application_data['updated_at'] = datetime.utcnow()
-            doc_ref.set(application_data)
-            return doc_ref.id
+            doc_ref = self.apps_col.document()
+            application_data['created_at'] = firestore.SERVER_TIMESTAMP
+            application_data['updated_at'] = firestore.SERVER_TIMESTAMP
+            for counter in APPLICATION_COUNTERS:
+                application_data[counter] = 0
+            
+            commit_time = await self._queue_writes(
+                lambda batch: batch.set(doc_ref, application_data),
+                lambda batch: self._update_status_counters(batch, None, application_data.get('verification_status'), total_delta=1)
+            )
+            self._stats_cache.clear()
+            application_data['created_at'] = application_data['updated_at'] = commit_time
+            created = {**application_data, 'id': doc_ref.id}
+            self._remember_read(('application', doc_ref.id), created)
+            return created
         except Exception as e:
-            logger.error(f"Error creating application: {e}")
-            raise Exception(f"Failed to create application: {str(e)}")
+            logger.error("Error creating application: %s", e)
+            raise FirestoreServiceError("Failed to create application") from e
     
     async def get_application_by_id(self, application_id: str) -> Optional[Dict[str, Any]]:
         """Get application by ID"""
         try:
-            doc_ref = self.get_collection('applications').document(application_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                app_data = doc.to_dict()
-                app_data['id'] = doc.id
-                return app_data
-            return None
+            doc_ref = self.apps_col.document(application_id)
+            return await self._read_listened(
+                ('application', application_id),
+                lambda db: db.collection(self.apps_col.id).document(application_id),
+                lambda: self._load_document(doc_ref)
+            )
         except Exception as e:
-            logger.error(f"Error getting application by ID: {e}")
+            logger.error("Error getting application by ID: %s", e)
             return None
     
-    async def get_applications_by_user(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all applications for a user"""
+    async def get_application_counts(self, application: Dict[str, Any]) -> Dict[str, Optional[int]]:
+        """Get a loaded application's document and verification counts from its counters"""
+        application_id = application['id']
         try:
-            applications = self.get_collection('applications').where('user_id', '==', user_id).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-            result = []
-            for app in applications:
+            counts = {counter: application.get(counter) for counter in APPLICATION_COUNTERS}
+            # Applications stored before the counters existed fall back to count aggregations
+            if counts['document_count'] is None:
+                counts['document_count'] = await self._count(self.docs_col.where(filter=FieldFilter('application_id', '==', application_id)))
+            if counts['verification_count'] is None:
+                counts['verification_count'] = await self._count(self.vers_col.where(filter=FieldFilter('application_id', '==', application_id)))
+            return counts
+        except Exception as e:
+            logger.error("Error getting application counts: %s", e)
+            return {counter: application.get(counter) for counter in APPLICATION_COUNTERS}
+    
+    async def iter_applications_by_user(self, user_id: str, fields: Optional[List[str]] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield a user's applications, newest first, as they arrive, optionally one page of the given fields"""
+        try:
+            query = self.apps_col.where(filter=FieldFilter('user_id', '==', user_id)).order_by('created_at', direction=DESCENDING)
+            applications = (await self._paginate(self.apps_col, query, limit, cursor, fields)).stream()
+            async for app in applications:
                 app_data = app.to_dict()
                 app_data['id'] = app.id
-                result.append(app_data)
-            return result
+                yield app_data
+        except InvalidCursorError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting applications by user: {e}")
-            return []
+            logger.error("Error getting applications by user: %s", e)
+            raise FirestoreServiceError("Failed to get applications") from e
     
-    async def get_all_applications(self) -> List[Dict[str, Any]]:
-        """Get all applications in the database (for global stats)"""
+    async def iter_all_applications(self, fields: Optional[List[str]] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield all applications, newest first, as they arrive, optionally one page of the given fields"""
         try:
-            applications = self.get_collection('applications').order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-            result = []
-            for app in applications:
+            query = self.apps_col.order_by('created_at', direction=DESCENDING)
+            applications = (await self._paginate(self.apps_col, query, limit, cursor, fields)).stream()
+            async for app in applications:
                 app_data = app.to_dict()
                 app_data['id'] = app.id
-                result.append(app_data)
-            return result
+                yield app_data
+        except InvalidCursorError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting all applications: {e}")
-            return []
+            logger.error("Error getting all applications: %s", e)
+            raise FirestoreServiceError("Failed to get applications") from e
+    
+    async def _count(self, query) -> int:
+        """Run a server-side count aggregation for a query"""
+        async with self._rpc_slots:
+            result = await query.count().get()
+        return result[0][0].value
     
-    async def update_application(self, application_id: str, update_data: Dict[str, Any]) -> bool:
-        """Update an application"""
+    async def _count_application_statuses(self) -> Dict[str, int]:
+        """Count applications per verification status with aggregation queries"""
+        applications = self.apps_col
+        queries = [applications] + [
+            applications.where(filter=FieldFilter('verification_status', '==', verification_status))
+            for verification_status in APPLICATION_STATUSES
+        ]
+        counts = await asyncio.gather(
+            *(self._count(query) for query in queries)
+        )
+        return {'total': counts[0], **dict(zip(APPLICATION_STATUSES, counts[1:]))}
+    
+    async def get_application_status_counts(self) -> Dict[str, int]:
+        """Count all applications and the applications in each verification status"""
         try:
-            doc_ref = self.get_collection('applications').document(application_id)
-            update_data['updated_at'] = datetime.utcnow()
-            doc_ref.update(update_data)
-            return True
+            async with self._stats_lock:
+                status_counts = self._stats_cache.get('status_counts')
+                if status_counts is None:
+                    async with self._rpc_slots:
+                        shards = [snapshot.to_dict() or {} async for snapshot in self.db.get_all(self._stats_shard_refs())]
+                    if any(shard.get('backfilled') for shard in shards):
+                        status_counts = {
+                            'total': sum(shard.get('total', 0) for shard in shards),
+                            **{
+                                verification_status: sum(shard.get('counts', {}).get(verification_status, 0) for shard in shards)
+                                for verification_status in APPLICATION_STATUSES
+                            }
+                        }
+                    else:
+                        # Until backfill_status_counts has run, count the applications directly
+                        status_counts = await self._count_application_statuses()
+                    self._stats_cache['status_counts'] = status_counts
+            return dict(status_counts)
         except Exception as e:
-            logger.error(f"Error updating application: {e}")
+            logger.error("Error counting applications: %s", e)
+            raise FirestoreServiceError("Failed to count applications") from e
+    
+    async def backfill_status_counts(self) -> bool:
+        """One-off migration seeding the global status counters from the stored applications; returns False if already seeded"""
+        try:
+            shard_refs = self._stats_shard_refs()
+            
+            @firestore.async_transactional
+            async def seed_in_transaction(transaction):
+                # Reading the shards in the transaction locks them, so counter increments from concurrent
+                # writes wait for the seed to commit instead of being overwritten by it
+                shards = [snapshot.to_dict() or {} async for snapshot in self.db.get_all(shard_refs, transaction=transaction)]
+                if any(shard.get('backfilled') for shard in shards):
+                    return False
+                status_counts = await self._count_application_statuses()
+                transaction.set(shard_refs[0], {
+                    'total': status_counts['total'],
+                    'counts': {verification_status: status_counts[verification_status] for verification_status in APPLICATION_STATUSES},
+                    'backfilled': True
+                })
+                for shard_ref in shard_refs[1:]:
+                    transaction.set(shard_ref, {'total': 0, 'counts': {verification_status: 0 for verification_status in APPLICATION_STATUSES}})
+                return True
+            
+            seeded = await seed_in_transaction(self.db.transaction())
+            self._stats_cache.clear()
+            logger.info("Seeded global status counts: %s", seeded)
+            return seeded
+        except Exception as e:
+            logger.error("Error backfilling status counts: %s", e)
+            raise FirestoreServiceError("Failed to backfill status counts") from e
+    
+    async def update_application(self, application_id: str, update_data: Dict[str, Any], expected_version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Update an application and return the updated document, or None if it does not exist"""
+        try:
+            doc_ref = self.apps_col.document(application_id)
+            update_data['updated_at'] = firestore.SERVER_TIMESTAMP
+            
+            @firestore.async_transactional
+            async def update_in_transaction(transaction):
+                snapshot = await doc_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    return False
+                # Optimistic concurrency: reject the update if the client edited an older version
+                version = snapshot.to_dict().get('version', 0)
+                if expected_version is not None and expected_version != version:
+                    raise VersionConflictError(f"Application {application_id} is at version {version}, not {expected_version}")
+                transaction.update(doc_ref, {**update_data, 'version': version + 1})
+                return True
+            
+            async with self._rpc_slots:
+                applied = await update_in_transaction(self.db.transaction())
+            if not applied:
+                return None
+            self._forget_reads(('application', application_id))
+            
+            # Read back the committed document for its server-stamped updated_at
+            updated = await self._load_document(doc_ref)
+            if updated is not None:
+                self._remember_read(('application', application_id), updated)
+            return updated
+        except VersionConflictError:
+            raise
+        except Exception as e:
+            logger.error("Error updating application: %s", e)
+            raise FirestoreServiceError("Failed to update application") from e
+    
+    async def set_verification_status(self, application_id: str, verification_status: str) -> bool:
+        """Set the verification status stored on an application"""
+        try:
+            doc_ref = self.apps_col.document(application_id)
+            
+            @firestore.async_transactional
+            async def set_status_in_transaction(transaction):
+                snapshot = await doc_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    return False
+                transaction.update(doc_ref, {
+                    'verification_status': verification_status,
+                    'verification_updated_at': firestore.SERVER_TIMESTAMP
+                })
+                self._update_status_counters(transaction, snapshot.to_dict().get('verification_status'), verification_status)
+                return True
+            
+            async with self._rpc_slots:
+                updated = await set_status_in_transaction(self.db.transaction())
+            self._stats_cache.clear()
+            self._forget_reads(('application', application_id))
+            return updated
+        except Exception as e:
+            logger.error("Error setting verification status: %s", e)
             return False
     
     async def delete_application(self, application_id: str) -> bool:
         """Delete an application"""
         try:
-            doc_ref = self.get_collection('applications').document(application_id)
-            doc_ref.delete()
+            doc_ref = self.apps_col.document(application_id)
+            
+            @firestore.async_transactional
+            async def delete_in_transaction(transaction):
+                snapshot = await doc_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    return
+                transaction.delete(doc_ref)
+                self._update_status_counters(transaction, snapshot.to_dict().get('verification_status'), None, total_delta=-1)
+            
+            async with self._rpc_slots:
+                await delete_in_transaction(self.db.transaction())
+            self._stats_cache.clear()
+            self._forget_reads(('application', application_id))
             return True
         except Exception as e:
-            logger.error(f"Error deleting application: {e}")
+            logger.error("Error deleting application: %s", e)
             return False
     
     # Document operations
-    async def create_document(self, document_data: Dict[str, Any]) -> str:
-        """Create a new document"""
+    async def create_document(self, document_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new document and return the stored document"""
         try:
-            doc_ref = self.get_collection('documents').document()
-            document_data['uploaded_at'] = datetime.utcnow()
-            doc_ref.set(document_data)
-            return doc_ref.id
+            doc_ref = self.docs_col.document()
+            application_id = document_data.get('application_id')
+            if not application_id:
+                document_data['uploaded_at'] = firestore.SERVER_TIMESTAMP
+                document_data['uploaded_at'] = await self._queue_writes(lambda batch: batch.set(doc_ref, document_data))
+                self._remember_read(('document', doc_ref.id), {**document_data, 'id': doc_ref.id})
+                return {**document_data, 'id': doc_ref.id}
+            
+            # A transaction doesn't report its commit time, so the upload is stamped on the client instead of read back
+            document_data['uploaded_at'] = datetime.now(timezone.utc)
+            
+            # The document and its application's counter are written together, so neither can land without the other
+            @firestore.async_transactional
+            async def create_in_transaction(transaction):
+                existing = await self._existing_applications(transaction, application_id)
+                transaction.set(doc_ref, document_data)
+                self._adjust_counter(transaction, existing, application_id, 'document_count', 1)
+            
+            async with self._rpc_slots:
+                await create_in_transaction(self.db.transaction())
+            self._forget_reads(('application', application_id))
+            self._remember_read(('document', doc_ref.id), {**document_data, 'id': doc_ref.id})
+            return {**document_data, 'id': doc_ref.id}
         except Exception as e:
-            logger.error(f"Error creating document: {e}")
-            raise Exception(f"Failed to create document: {str(e)}")
+            logger.error("Error creating document: %s", e)
+            raise FirestoreServiceError("Failed to create document") from e
     
     async def get_document_by_id(self, document_id: str) -> Optional[Dict[str, Any]]:
         """Get document by ID"""
         try:
-            doc_ref = self.get_collection('documents').document(document_id)
-            doc = doc_ref.get()
-            if doc.exists:
-                doc_data = doc.to_dict()
-                doc_data['id'] = doc.id
-                return doc_data
-            return None
+            doc_ref = self.docs_col.document(document_id)
+            return await self._read_listened(
+                ('document', document_id),
+                lambda db: db.collection(self.docs_col.id).document(document_id),
+                lambda: self._load_document(doc_ref)
+            )
         except Exception as e:
-            logger.error(f"Error getting document by ID: {e}")
+            logger.error("Error getting document by ID: %s", e)
             return None
     
-    async def get_documents_by_user(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all documents for a user"""
+    async def get_documents_by_user(self, user_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get all documents for a user, optionally only the given fields"""
         try:
-            documents = self.get_collection('documents').where('user_id', '==', user_id).order_by('uploaded_at', direction=firestore.Query.DESCENDING).stream()
-            result = []
-            for doc in documents:
-                doc_data = doc.to_dict()
-                doc_data['id'] = doc.id
-                result.append(doc_data)
-            return result
+            query = self.docs_col.where(filter=FieldFilter('user_id', '==', user_id)).order_by('uploaded_at', direction=DESCENDING)
+            if fields is not None:
+                query = query.select(fields)
+            return await self._fetch(query)
         except Exception as e:
-            logger.error(f"Error getting documents by user: {e}")
+            logger.error("Error getting documents by user: %s", e)
             return []
     
-    async def get_all_documents(self) -> List[Dict[str, Any]]:
-        """Get all documents from all users"""
+    async def iter_all_documents(self, fields: Optional[List[str]] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield documents from all users, newest first, as they arrive, optionally one page of the given fields"""
         try:
-            documents = self.get_collection('documents').order_by('uploaded_at', direction=firestore.Query.DESCENDING).stream()
-            result = []
-            for doc in documents:
+            query = self.docs_col.order_by('uploaded_at', direction=DESCENDING)
+            documents = (await self._paginate(self.docs_col, query, limit, cursor, fields)).stream()
+            async for doc in documents:
                 doc_data = doc.to_dict()
                 doc_data['id'] = doc.id
-                result.append(doc_data)
-            return result
+                yield doc_data
+        except InvalidCursorError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting all documents: {e}")
-            return []
+            logger.error("Error getting all documents: %s", e)
+            raise FirestoreServiceError("Failed to get documents") from e
     
-    async def get_documents_by_application(self, application_id: str) -> List[Dict[str, Any]]:
-        """Get all documents for an application"""
+    async def get_documents_by_application(self, application_id: str, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get all documents for an application, optionally only the given fields (an empty list fetches just the IDs)"""
         try:
-            documents = self.get_collection('documents').where('application_id', '==', application_id).stream()
-            result = []
-            for doc in documents:
-                doc_data = doc.to_dict()
-                doc_data['id'] = doc.id
-                result.append(doc_data)
-            return result
+            query = self.docs_col.where(filter=FieldFilter('application_id', '==', application_id))
+            if fields is not None:
+                query = query.select(fields)
+            return await self._fetch(query)
         except Exception as e:
-            logger.error(f"Error getting documents by application: {e}")
+            logger.error("Error getting documents by application: %s", e)
             return []
     
     async def update_document(self, document_id: str, update_data: Dict[str, Any]) -> bool:
         """Update a document"""
         try:
-            doc_ref = self.get_collection('documents').document(document_id)
-            doc_ref.update(update_data)
+            doc_ref = self.docs_col.document(document_id)
+            if 'application_id' not in update_data:
+                async with self._rpc_slots:
+                    await doc_ref.update(update_data)
+                self._forget_reads(('document', document_id))
+                return True
+            
+            # Relinking moves the document between applications' counters in the same transaction as the update
+            @firestore.async_transactional
+            async def relink_in_transaction(transaction):
+                snapshot = await doc_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    raise NotFound(f"Document {document_id} does not exist")
+                old_application_id = snapshot.to_dict().get('application_id')
+                new_application_id = update_data['application_id']
+                existing = set()
+                if old_application_id != new_application_id:
+                    existing = await self._existing_applications(transaction, old_application_id, new_application_id)
+                transaction.update(doc_ref, update_data)
+                if old_application_id != new_application_id:
+                    self._adjust_counter(transaction, existing, new_application_id, 'document_count', 1)
+                    self._adjust_counter(transaction, existing, old_application_id, 'document_count', -1)
+                return old_application_id
+            
+            async with self._rpc_slots:
+                old_application_id = await relink_in_transaction(self.db.transaction())
+            self._forget_reads(('document', document_id), ('application', old_application_id), ('application', update_data['application_id']))
             return True
         except Exception as e:
-            logger.error(f"Error updating document: {e}")
+            logger.error("Error updating document: %s", e)
             return False
     
     async def delete_document(self, document_id: str) -> bool:
         """Delete a document"""
         try:
-            doc_ref = self.get_collection('documents').document(document_id)
-            doc_ref.delete()
+            doc_ref = self.docs_col.document(document_id)
+            
+            # Only a document that still exists decrements its application's counter, in the same transaction as the delete
+            @firestore.async_transactional
+            async def delete_in_transaction(transaction):
+                snapshot = await doc_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    return None
+                application_id = snapshot.to_dict().get('application_id')
+                existing = await self._existing_applications(transaction, application_id)
+                transaction.delete(doc_ref)
+                self._adjust_counter(transaction, existing, application_id, 'document_count', -1)
+                return application_id
+            
+            async with self._rpc_slots:
+                application_id = await delete_in_transaction(self.db.transaction())
+            self._forget_reads(('document', document_id), ('application', application_id))
             return True
         except Exception as e:
-            logger.error(f"Error deleting document: {e}")
+            logger.error("Error deleting document: %s", e)
             return False
     
-    async def delete_documents_by_application(self, application_id: str) -> bool:
-        """Delete all documents associated with an application"""
+    async def delete_documents_by_application(self, application_id: str, application: Optional[Dict[str, Any]] = None) -> bool:
+        """Delete all documents associated with an application, skipping the query if the loaded application has none"""
         try:
-            # Get all documents for the application
-            documents = await self.get_documents_by_application(application_id)
-            
-            # Delete each document
-            for doc in documents:
-                doc_ref = self.get_collection('documents').document(doc["id"])
-                doc_ref.delete()
-            
-            logger.info(f"Deleted {len(documents)} documents for application {application_id}")
+            if self._counter_is_zero(application, 'document_count'):
+                return True
+            query = self.docs_col.where(filter=FieldFilter('application_id', '==', application_id))
+            deleted = await self._bulk_delete(query)
+            self._forget_reads(*(('document', document['id']) for document in deleted))
+            logger.info("Deleted %s documents for application %s", len(deleted), application_id)
             return True
         except Exception as e:
-            logger.error(f"Error deleting documents by application: {e}")
+            logger.error("Error deleting documents by application: %s", e)
             return False
     
     # Verification operations
     async def create_verification(self, verification_data: Dict[str, Any]) -> str:
-        """Create a new verification result"""
+        """Create a new verification result and update the application's verification status"""
         try:
-            doc_ref = self.get_collection('verifications').document()
-            verification_data['created_at'] = datetime.utcnow()
-            verification_data['updated_at'] = datetime.utcnow()
-            doc_ref.set(verification_data)
+            doc_ref = self.vers_col.document()
+            verification_data['created_at'] = firestore.SERVER_TIMESTAMP
+            verification_data['updated_at'] = firestore.SERVER_TIMESTAMP
+            
+            application_ref = self.apps_col.document(verification_data['application_id'])
+            
+            # Store the latest status on the application so reads don't have to query verifications
+            @firestore.async_transactional
+            async def create_in_transaction(transaction):
+                snapshot = await application_ref.get(transaction=transaction)
+                # Denormalize the owner so a user's verifications can be queried directly
+                if snapshot.exists:
+                    verification_data['user_id'] = snapshot.to_dict().get('user_id')
+                transaction.set(doc_ref, verification_data)
+                transaction.update(application_ref, {
+                    'verification_status': verification_data.get('overall_status'),
+                    'verification_updated_at': firestore.SERVER_TIMESTAMP,
+                    'verification_count': firestore.Increment(1)
+                })
+                old_status = snapshot.to_dict().get('verification_status') if snapshot.exists else None
+                self._update_status_counters(transaction, old_status, verification_data.get('overall_status'))
+            
+            async with self._rpc_slots:
+                await create_in_transaction(self.db.transaction())
+            self._stats_cache.clear()
+            # The listeners may not have pushed this write yet, so reads go to Firestore until new ones sync
+            self._forget_reads(('latest', verification_data['application_id']), ('application', verification_data['application_id']))
             return doc_ref.id
         except Exception as e:
-            logger.error(f"Error creating verification: {e}")
-            raise Exception(f"Failed to create verification: {str(e)}")
+            logger.error("Error creating verification: %s", e)
+            raise FirestoreServiceError("Failed to create verification") from e
+    
+    async def _paginate(self, collection, query, limit: Optional[int], cursor: Optional[str], fields: Optional[List[str]] = None):
+        """Limit a query to one page of the given fields, starting after the cursor document in the collection"""
+        if fields is not None:
+            query = query.select(fields)
+        if cursor:
+            async with self._rpc_slots:
+                cursor_snapshot = await collection.document(cursor).get()
+            if not cursor_snapshot.exists:
+                raise InvalidCursorError(f"Unknown cursor: {cursor}")
+            query = query.start_after(cursor_snapshot)
+        if limit:
+            query = query.limit(limit)
+        return query
     
-    async def get_verifications_by_application(self, application_id: str) -> List[Dict[str, Any]]:
-        """Get all verifications for an application"""
+    async def get_verifications_by_application(self, application_id: str, limit: Optional[int] = None, cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get verifications for an application, newest first, optionally one page at a time"""
         try:
-            verifications = self.get_collection('verifications').where('application_id', '==', application_id).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-            result = []
-            for ver in verifications:
-                ver_data = ver.to_dict()
-                ver_data['id'] = ver.id
-                result.append(ver_data)
-            return result
+            query = self.vers_col.where(filter=FieldFilter('application_id', '==', application_id)).order_by('created_at', direction=DESCENDING)
+            return await self._fetch(await self._paginate(self.vers_col, query, limit, cursor, fields))
+        except InvalidCursorError:
+            raise
         except Exception as e:
-            logger.error(f"Error getting verifications by application: {e}")
-            return []
+            logger.error("Error getting verifications by application: %s", e)
+            raise FirestoreServiceError("Failed to get verifications") from e
+    
+    def _latest_verification_query(self, db, application_id: str):
+        """Build the query for an application's latest verification on the given client"""
+        return db.collection(self.vers_col.id).where(filter=FieldFilter('application_id', '==', application_id)).order_by('created_at', direction=DESCENDING).limit(1)
     
     async def get_latest_verification(self, application_id: str) -> Optional[Dict[str, Any]]:
-        """Get the latest verification for an application"""
+        """Get the latest verification for an application, from its snapshot listener once synced"""
         try:
-            verifications = self.get_collection('verifications').where('application_id', '==', application_id).order_by('created_at', direction=firestore.Query.DESCENDING).limit(1).stream()
-            for ver in verifications:
-                ver_data = ver.to_dict()
-                ver_data['id'] = ver.id
-                return ver_data
-            return None
+            async def load():
+                verifications = await self._fetch(self._latest_verification_query(self.db, application_id))
+                return verifications[0] if verifications else None
+            
+            return await self._read_listened(
+                ('latest', application_id),
+                lambda db: self._latest_verification_query(db, application_id),
+                load
+            )
         except Exception as e:
-            logger.error(f"Error getting latest verification: {e}")
+            logger.error("Error getting latest verification: %s", e)
             return None
     
-    async def get_all_verifications_by_user(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all verifications for a user's applications"""
+    async def get_latest_verifications_bulk(self, application_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the latest verification for each application, keyed by application ID"""
         try:
-            # First get all application IDs for the user
-            applications = await self.get_applications_by_user(user_id)
-            application_ids = [app['id'] for app in applications]
-            
-            if not application_ids:
-                return []
+            chunks = [
+                application_ids[i:i + IN_QUERY_LIMIT]
+                for i in range(0, len(application_ids), IN_QUERY_LIMIT)
+            ]
+            chunk_results = await asyncio.gather(
+                *(self._get_latest_verifications_chunk(chunk) for chunk in chunks)
+            )
+            result = {}
+            for chunk_result in chunk_results:
+                result.update(chunk_result)
+            return result
+        except Exception as e:
+            logger.error("Error getting latest verifications in bulk: %s", e)
+            return {}
+    
+    async def _get_latest_verifications_chunk(self, application_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the latest verification for up to IN_QUERY_LIMIT applications in one query"""
+        verifications = await self._fetch(
+            self.vers_col.where(filter=FieldFilter('application_id', 'in', application_ids)).order_by('created_at', direction=DESCENDING)
+        )
+        result = {}
+        for ver_data in verifications:
+            # Results are newest first, so the first hit per application is the latest
+            result.setdefault(ver_data['application_id'], ver_data)
+        return result
+    
+    async def get_all_verifications_by_user(self, user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get verifications for a user's applications, newest first, optionally one page at a time"""
+        try:
+            query = self.vers_col.where(filter=FieldFilter('user_id', '==', user_id)).order_by('created_at', direction=DESCENDING)
+            return await self._fetch(await self._paginate(self.vers_col, query, limit, cursor, fields))
+        except InvalidCursorError:
+            raise
+        except Exception as e:
+            logger.error("Error getting all verifications by user: %s", e)
+            raise FirestoreServiceError("Failed to get verifications") from e
+    
+    async def backfill_verification_user_ids(self) -> int:
+        """One-off migration copying user_id from each verification's application onto verifications stored without it"""
+        try:
+            owners = {
+                app.id: app.to_dict().get('user_id')
+                async for app in self.apps_col.select(['user_id']).stream()
+            }
             
-            # Get verifications for all applications
-            verifications = self.get_collection('verifications').where('application_id', 'in', application_ids).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
-            result = []
-            for ver in verifications:
+            updated = 0
+            writer = self.db.bulk_writer()
+            async for ver in self.vers_col.select(['application_id', 'user_id']).stream():
                 ver_data = ver.to_dict()
-                ver_data['id'] = ver.id
-                result.append(ver_data)
-            return result
+                owner = owners.get(ver_data.get('application_id'))
+                if owner and not ver_data.get('user_id'):
+                    writer.update(ver.reference, {'user_id': owner})
+                    updated += 1
+            await run_blocking(writer.close)
+            logger.info("Backfilled user_id on %s verifications", updated)
+            return updated
         except Exception as e:
-            logger.error(f"Error getting all verifications by user: {e}")
-            return []
+            logger.error("Error backfilling verification user IDs: %s", e)
+            raise FirestoreServiceError("Failed to backfill verification user IDs") from e
+    
+    async def backfill_application_counts(self) -> int:
+        """One-off migration setting document_count and verification_count on applications stored without them"""
+        try:
+            counts: Dict[str, Dict[str, int]] = {}
+            async for doc in self.docs_col.select(['application_id']).stream():
+                application_id = doc.to_dict().get('application_id')
+                if application_id:
+                    app_counts = counts.setdefault(application_id, {})
+                    app_counts['document_count'] = app_counts.get('document_count', 0) + 1
+            async for ver in self.vers_col.select(['application_id']).stream():
+                application_id = ver.to_dict().get('application_id')
+                if application_id:
+                    app_counts = counts.setdefault(application_id, {})
+                    app_counts['verification_count'] = app_counts.get('verification_count', 0) + 1
+            
+            updated = 0
+            writer = self.db.bulk_writer()
+            async for app in self.apps_col.select(list(APPLICATION_COUNTERS)).stream():
+                app_data = app.to_dict()
+                if any(app_data.get(counter) is None for counter in APPLICATION_COUNTERS):
+                    app_counts = counts.get(app.id, {})
+                    writer.update(app.reference, {counter: app_counts.get(counter, 0) for counter in APPLICATION_COUNTERS})
+                    updated += 1
+            await run_blocking(writer.close)
+            logger.info("Backfilled counters on %s applications", updated)
+            return updated
+        except Exception as e:
+            logger.error("Error backfilling application counts: %s", e)
+            raise FirestoreServiceError("Failed to backfill application counts") from e
     
-    async def delete_verifications_by_application(self, application_id: str) -> bool:
-        """Delete all verifications for an application"""
+    async def delete_verifications_by_application(self, application_id: str, application: Optional[Dict[str, Any]] = None) -> bool:
+        """Delete all verifications for an application, skipping the query if the loaded application has none"""
         try:
-            verifications = self.get_collection('verifications').where('application_id', '==', application_id).stream()
-            for ver in verifications:
-                ver.reference.delete()
+            if self._counter_is_zero(application, 'verification_count'):
+                return True
+            query = self.vers_col.where(filter=FieldFilter('application_id', '==', application_id))
+            await self._bulk_delete(query)
+            self._forget_reads(('latest', application_id))
             return True
         except Exception as e:
-            logger.error(f"Error deleting verifications by application: {e}")
+            logger.error("Error deleting verifications by application: %s", e)
             return False
     
     async def delete_verifications_by_document(self, document_id: str) -> bool:
         """Delete all verifications for a document"""
         try:
-            verifications = self.get_collection('verifications').where('document_id', '==', document_id).stream()
-            for ver in verifications:
-                ver.reference.delete()
+            query = self.vers_col.where(filter=FieldFilter('document_id', '==', document_id))
+            deleted = await self._bulk_delete(query, fields=['application_id'])
+            # Lowered after the deletes, so a failed delete can leave a counter too high but never too low
+            deleted_per_application = Counter(verification.get('application_id') for verification in deleted)
+            deleted_per_application.pop(None, None)
+            if deleted_per_application:
+                @firestore.async_transactional
+                async def decrement_in_transaction(transaction):
+                    existing = await self._existing_applications(transaction, *deleted_per_application)
+                    for application_id, deleted_count in deleted_per_application.items():
+                        self._adjust_counter(transaction, existing, application_id, 'verification_count', -deleted_count)
+                
+                async with self._rpc_slots:
+                    await decrement_in_transaction(self.db.transaction())
+                self._forget_reads(*(
+                    (kind, application_id) for application_id in deleted_per_application for kind in ('latest', 'application')
+                ))
             return True
         except Exception as e:
-            logger.error(f"Error deleting verifications by document: {e}")
+            logger.error("Error deleting verifications by document: %s", e)
             return False
 
 # Global instance
@@ -1,70 +1,84 @@
 from google.cloud import storage
 from app.core.config import settings
+from app.core.executor import run_blocking
+import google_crc32c
 import logging
 import uuid
-from typing import Optional
+from typing import BinaryIO
+from urllib.parse import unquote
 
 logger = logging.getLogger(__name__)
 
+class StorageServiceError(Exception):
+    """Raised when a Cloud Storage upload fails"""
+
+# Files from this size up are sent as a resumable upload in chunks of this size
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
 class GCPService:
     def __init__(self):
         self.bucket_name = settings.GCP_BUCKET_NAME
         self.client = storage.Client()
         self.bucket = self.client.bucket(self.bucket_name)
+        self._url_prefix = f"https://storage.googleapis.com/{self.bucket_name}/"
+        
+        # Upload checksums use the hardware CRC32C instruction only through the C extension
+        if google_crc32c.implementation != "c":
+            logger.warning("google-crc32c C extension unavailable; upload checksums use the slow pure-Python fallback")
     
-    async def upload_file(self, file_content: bytes, filename: str, content_type: str) -> str:
-        """Upload file to GCP Cloud Storage and return public URL"""
+    async def warmup(self) -> None:
+        """Make a metadata request so the HTTP session and credentials are ready before the first upload"""
+        try:
+            await run_blocking(self.bucket.blob(".warmup").exists)
+        except Exception as e:
+            logger.error("Error warming up GCP storage client: %s", e)
+    
+    def _blob_name(self, gcp_url: str) -> str:
+        """Extract the blob name from a public URL in this bucket"""
+        if not gcp_url.startswith(self._url_prefix):
+            raise ValueError(f"URL is not in bucket {self.bucket_name}: {gcp_url}")
+        # Public URLs percent-encode the object name
+        return unquote(gcp_url.removeprefix(self._url_prefix))
+    
+    async def upload_file_stream(self, stream: BinaryIO, filename: str, content_type: str, size: int) -> str:
+        """Upload a file-like object to GCP Cloud Storage and return public URL"""
         try:
             # Generate unique filename
             unique_filename = f"{uuid.uuid4()}_{filename}"
             
-            # Create blob
-            blob = self.bucket.blob(unique_filename)
-            
-            # Upload file
-            blob.upload_from_string(file_content, content_type=content_type)
+            # Create blob; a chunk size switches large files to a resumable upload
+            blob = self.bucket.blob(
+                unique_filename,
+                chunk_size=UPLOAD_CHUNK_SIZE if size >= RESUMABLE_UPLOAD_THRESHOLD else None
+            )
             
-            # Make blob publicly accessible
-            blob.make_public()
+            # Upload file from the stream without loading it into memory or blocking the event loop
+            await run_blocking(
+                blob.upload_from_file, stream, content_type=content_type, size=size, checksum="crc32c"
+            )
             
-            # Return public URL
+            # Objects are readable through the bucket's uniform access policy, so no per-object ACL call
             return blob.public_url
             
         except Exception as e:
-            logger.error(f"Error uploading file to GCP: {e}")
-            raise Exception(f"Failed to upload file: {str(e)}")
+            logger.error("Error uploading file to GCP: %s", e)
+            raise StorageServiceError("Failed to upload file") from e
     
     async def delete_file(self, gcp_url: str) -> bool:
         """Delete file from GCP Cloud Storage"""
         try:
-            # Extract blob name from URL
-            blob_name = gcp_url.split(f"https://storage.googleapis.com/{self.bucket_name}/")[-1]
+            blob_name = self._blob_name(gcp_url)
             
             # Delete blob
             blob = self.bucket.blob(blob_name)
-            blob.delete()
+            await run_blocking(blob.delete)
             
             return True
             
         except Exception as e:
-            logger.error(f"Error deleting file from GCP: {e}")
+            logger.error("Error deleting file from GCP: %s", e)
             return False
-    
-    async def get_file_url(self, gcp_url: str) -> Optional[str]:
-        """Get signed URL for private file access"""
-        try:
-            # Extract blob name from URL
-            blob_name = gcp_url.split(f"https://storage.googleapis.com/{self.bucket_name}/")[-1]
-            
-            # Generate signed URL (valid for 1 hour)
-            blob = self.bucket.blob(blob_name)
-            signed_url = blob.generate_signed_url(expiration=3600)
-            
-            return signed_url
-            
-        except Exception as e:
-            logger.error(f"Error generating signed URL: {e}")
-            return None
 
 # Global instance
 gcp_service = GCPService()
@@ -1,76 +1,32 @@
-import google.generativeai as genai
 from app.core.config import settings
+from app.core.executor import run_blocking
+from app.core.http import http_client
 import logging
-import json
-import requests
-import base64
-from typing import Dict, Any
+import orjson
+import os
+import asyncio
+import hashlib
+import httpx
+import re
+import textwrap
+from bisect import bisect_right
+from datetime import date, datetime
+from dateutil import parser as date_parser
+from cachetools import LRUCache, TTLCache
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 
 logger = logging.getLogger(__name__)
 
-class GeminiOCRService:
-    def __init__(self):
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        # Try different model names in order of preference (newest first)
-        self.model_names = [
-            'gemini-2.5-flash',      # Latest and fastest
-            'gemini-2.5-pro',        # Latest and most capable
-            'gemini-2.0-flash',      # Gemini 2.0 series
-            'gemini-2.0-pro',        # Gemini 2.0 series
-            'gemini-1.5-pro',        # Fallback to 1.5 series
-            'gemini-1.5-flash',      # Fallback to 1.5 series
-            'gemini-pro',            # Legacy fallback
-            'gemini-1.0-pro'         # Legacy fallback
-        ]
-        self.model = None
-        self._initialize_model()
-    
-    def _initialize_model(self):
-        """Initialize the model with the first available one"""
-        for model_name in self.model_names:
-            try:
-                self.model = genai.GenerativeModel(model_name)
-                logger.info(f"Successfully initialized Gemini model: {model_name}")
-                
-                # Log model capabilities
-                if '2.5' in model_name:
-                    logger.info("🚀 Using latest Gemini 2.5 model with enhanced capabilities")
-                elif '2.0' in model_name:
-                    logger.info("⚡ Using Gemini 2.0 model with improved performance")
-                elif '1.5' in model_name:
-                    logger.info("✅ Using stable Gemini 1.5 model")
-                else:
-                    logger.info("📦 Using legacy Gemini model")
-                
-                break
-            except Exception as e:
-                logger.warning(f"Failed to initialize model {model_name}: {e}")
-                continue
-        
-        if self.model is None:
-            # List available models for debugging
-            try:
-                available_models = list(genai.list_models())
-                logger.error(f"Available models: {[model.name for model in available_models]}")
-            except Exception as e:
-                logger.error(f"Could not list available models: {e}")
-            raise Exception("Failed to initialize any Gemini model. Please check your API key and model availability.")
-    
-    def get_current_model_name(self) -> str:
-        """Get the name of the currently initialized model"""
-        return self.model.model_name if self.model else "No model initialized"
-    
-    async def extract_paystub_data(self, image_url: str) -> Dict[str, Any]:
-        """Extract structured data from pay stub using Gemini Vision with enhanced processing"""
-        try:
-            logger.info(f"Extracting data from image URL: {image_url}")
-            logger.info(f"Using Gemini model: {self.get_current_model_name()}")
-            if not settings.GEMINI_API_KEY or settings.GEMINI_API_KEY == "your_gemini_api_key_here":
-                logger.error("Gemini API key not configured")
-                raise Exception("Gemini API key not configured")
-            
-            # Expert-level prompt with comprehensive field recognition
-            prompt = """
+# Uploaded objects get unique, never-overwritten names, so OCR output per URL can be kept
+OCR_CACHE_SIZE = 1000
+# The same file uploaded again under a new URL is recognized by its content hash for a week
+OCR_CONTENT_CACHE_TTL = 7 * 24 * 60 * 60
+# Part of every OCR cache key; bump it when the extraction prompt changes so stale results are not served
+PROMPT_VERSION = "v2"
+
+# Expert-level prompt with comprehensive field recognition, dedented so indentation isn't sent as tokens
+PAYSTUB_PROMPT = textwrap.dedent("""
             You are an expert financial document analyst specializing in pay stubs, income statements, and employment verification documents. 
             Analyze this document and extract the following information in JSON format with maximum accuracy:
             
@@ -215,91 +171,518 @@ class GeminiOCRService:
             - W-2 forms, 1099 forms, Tax documents
             - Bank statements, Direct deposit notifications
             - Employment verification letters, Salary verification forms
-            """
-            
-            # Download the file from GCP URL with retry logic
-            logger.info(f"Downloading file from URL: {image_url}")
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    file_response = requests.get(image_url, timeout=30)
-                    file_response.raise_for_status()
-                    break
-                except requests.exceptions.RequestException as e:
-                    if attempt == max_retries - 1:
-                        raise Exception(f"Failed to download file after {max_retries} attempts: {str(e)}")
-                    logger.warning(f"Download attempt {attempt + 1} failed: {e}, retrying...")
-                    import time
-                    time.sleep(2 ** attempt)  # Exponential backoff
-            
-            # Determine MIME type based on file extension
-            if image_url.lower().endswith('.pdf'):
-                mime_type = "application/pdf"
-            elif image_url.lower().endswith('.png'):
-                mime_type = "image/png"
-            elif image_url.lower().endswith('.jpg') or image_url.lower().endswith('.jpeg'):
-                mime_type = "image/jpeg"
-            else:
-                mime_type = "image/jpeg"  # Default fallback
-            
-            # Convert to base64
-            file_data = base64.b64encode(file_response.content).decode('utf-8')
-            
-            # Generate content with retry logic
-            for attempt in range(max_retries):
-                try:
-                    response = self.model.generate_content([
-                        prompt,
-                        {
-                            "mime_type": mime_type,
-                            "data": file_data
-                        }
-                    ])
-                    break
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        raise Exception(f"Failed to process document after {max_retries} attempts: {str(e)}")
-                    logger.warning(f"OCR attempt {attempt + 1} failed: {e}, retrying...")
-                    import time
-                    time.sleep(2 ** attempt)  # Exponential backoff
-            
-            # Parse the response with enhanced error handling
-            extracted_text = response.text.strip()
-            logger.info(f"Raw OCR response: {extracted_text[:500]}...")  # Log first 500 chars
-            
-            # Clean up the response to extract JSON
-            json_text = self._extract_json_from_response(extracted_text)
-            
-            # Parse JSON with validation
-            extracted_data = self._parse_and_validate_json(json_text)
+            """).strip()
+# Follows the prompt when several documents are sent in one request
+BATCH_PROMPT = textwrap.dedent("""
+            You will receive {count} documents, numbered from 0 in the order they are attached.
+            Extract the fields above from each one and return ONLY valid JSON in this shape, with one entry per document:
+            {{"documents": [{{"index": 0, "employee_name": ..., ...}}, {{"index": 1, "employee_name": ..., ...}}]}}
+            """).strip()
+# Documents sent in one generate_content request; larger groups are split
+MAX_OCR_BATCH = 16
+# Attempts for each download and model call, with exponential backoff between them
+MAX_RETRIES = 3
+
+# Ways a model response may wrap its JSON, tried in order
+JSON_PATTERNS = [
+    re.compile(r"```json\s*(.*?)\s*```", re.DOTALL),
+    re.compile(r"```\s*(.*?)\s*```", re.DOTALL),
+    re.compile(r"\{.*\}", re.DOTALL),
+]
+# MIME types sent to Gemini by file extension
+MIME_TYPES = {
+    ".pdf": "application/pdf",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+}
+# Characters dropped from amounts and SSNs before parsing, each in a single translate pass
+AMOUNT_STRIP = str.maketrans("", "", "$,€£¥₹ ")
+SSN_STRIP = str.maketrans("", "", "- _")
+# Everything but digits, so masked or formatted SSNs ("***-**-1234") reduce to their digits
+NON_DIGIT_RE = re.compile(r"\D")
+# Business suffixes ignored when comparing employer names, matched as whole words
+BUSINESS_SUFFIX_RE = re.compile(r"[ .](?:inc|llc|corp|ltd|company|co|enterprises|group)\b", re.IGNORECASE)
+# Fields compared during verification, with the result key each check sets, in report order
+VERIFIED_FIELDS = (("name", "name_match"), ("salary", "salary_match"), ("employer", "employer_match"), ("ssn", "ssn_match"))
+FIELD_LABELS = {"name": "Name", "salary": "Salary", "employer": "Employer", "ssn": "SSN"}
+# Per-field summary lines, built once instead of formatted on every verification
+MATCH_DETAILS = {field: f"✓ {label} Match" for field, label in FIELD_LABELS.items()}
+MISMATCH_DETAILS = {field: f"✗ {label} Mismatch" for field, label in FIELD_LABELS.items()}
+# Fields parsed as amounts or quantities
+NUMERIC_FIELDS = ("annual_salary", "gross_pay", "net_pay", "hourly_rate", "hours_worked", "year_to_date_gross", "year_to_date_net")
+# Pay period wording, matched in one pass; the leftmost match wins, so "bi-weekly" is never read as weekly
+PAY_PERIOD_RE = re.compile(
+    r"(?P<biweekly>bi[- ]?week)|(?P<semimonthly>semi[- ]?month)|(?P<weekly>week)|(?P<monthly>month)|(?P<daily>da(?:il)?y)",
+    re.IGNORECASE
+)
+PAY_PERIODS_PER_YEAR = {
+    "weekly": 52,
+    "biweekly": 26,
+    "semimonthly": 24,
+    "monthly": 12,
+    "daily": 260,  # Assuming 5 days/week, 52 weeks/year
+}
+# Values the model uses for a field it could not find
+NULL_INDICATORS = frozenset({"", "null", "none", "n/a", "na", "not available", "unknown", "tbd"})
+# Fills in the parts a pay date leaves out, such as the day of "March 2024"; a parsed date still in
+# this year had no year of its own and is rejected
+PAY_DATE_DEFAULT = datetime(1900, 1, 1)
+
+# Dynamic salary tolerance (more flexible): 15% below $30k, 12% below $100k, 10% above
+# (increased from 10%, 7% and 5%); a salary equal to a bound falls in the higher range
+SALARY_TOLERANCE_BOUNDS = (30000, 100000)
+SALARY_TOLERANCES = (15, 12, 10)
+
+# Re-verifies and retried uploads compare the same normalized pairs, so scores are memoized process-wide
+SIMILARITY_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=SIMILARITY_CACHE_SIZE)
+def _name_similarity(name1: str, name2: str) -> float:
+    """Calculate similarity between two normalized names from the words they share"""
+    if not name1 or not name2:
+        return 0.0
+    
+    if name1 == name2:
+        return 1.0
+    
+    # Words are compared whole, so names one letter apart ("Mary" and "Mark") are different people;
+    # word order doesn't matter
+    words1_list = name1.split()
+    words2_list = name2.split()
+    words1 = set(words1_list)
+    words2 = set(words2_list)
+    
+    if not words1 or not words2:
+        return 0.0
+    
+    # Calculate Jaccard similarity
+    jaccard_sim = len(words1 & words2) / len(words1 | words2)
+    
+    # Share of the shorter name's words found in the longer name
+    if len(words1_list) <= len(words2_list):
+        shorter, longer = words1_list, words2
+    else:
+        shorter, longer = words2_list, words1
+    word_order_sim = sum(1 for word in shorter if word in longer) / len(shorter)
+    
+    # Combine similarities (weighted average)
+    return min((jaccard_sim * 0.6) + (word_order_sim * 0.4), 1.0)
+
+@lru_cache(maxsize=SIMILARITY_CACHE_SIZE)
+def _employer_similarity(employer1: str, employer2: str) -> float:
+    """Calculate similarity between two normalized employer names"""
+    if not employer1 or not employer2:
+        return 0.0
+    
+    if employer1 == employer2:
+        return 1.0
+    
+    # Remove common business suffixes
+    employer1 = BUSINESS_SUFFIX_RE.sub('', employer1)
+    employer2 = BUSINESS_SUFFIX_RE.sub('', employer2)
+    
+    # Same word-level score as names, so a name that is only part of the other ("Bank" and
+    # "Bank of America") or a different company with a shared prefix ("Apple" and "Applebees") fails
+    return _name_similarity(employer1, employer2)
+
+# The Gemini SDK takes about half a second to import, so it is loaded on first use rather than with the routers
+_genai = None
+
+def _get_genai():
+    """Import and configure the Gemini SDK on first use"""
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        _genai = genai
+    return _genai
+
+@lru_cache(maxsize=None)
+def _paystub_prompt_part():
+    """Built once and sent as the same leading part of every request, so the SDK doesn't rebuild it per call"""
+    return _get_genai().protos.Part(text=PAYSTUB_PROMPT)
+
+class GeminiOCRService:
+    def __init__(self):
+        # Try different model names in order of preference (newest first)
+        self.model_names = [
+            'gemini-2.5-flash',      # Latest and fastest
+            'gemini-2.5-pro',        # Latest and most capable
+            'gemini-2.0-flash',      # Gemini 2.0 series
+            'gemini-2.0-pro',        # Gemini 2.0 series
+            'gemini-1.5-pro',        # Fallback to 1.5 series
+            'gemini-1.5-flash',      # Fallback to 1.5 series
+            'gemini-pro',            # Legacy fallback
+            'gemini-1.0-pro'         # Legacy fallback
+        ]
+        # A model pinned in settings goes ahead of the defaults
+        self.model_names = list(dict.fromkeys(name for name in [settings.GEMINI_MODEL] + self.model_names if name))
+        self._model = None
+        # Resolving the model makes metadata requests, so concurrent first uses share one resolution
+        self._model_lock = asyncio.Lock()
+        self._ocr_cache = LRUCache(maxsize=OCR_CACHE_SIZE)
+        self._content_cache = TTLCache(maxsize=OCR_CACHE_SIZE, ttl=OCR_CONTENT_CACHE_TTL)
+        # Extractions in flight per cache key, so concurrent requests for one document share a model call
+        self._inflight_extractions: Dict[tuple, asyncio.Future] = {}
+    
+    @property
+    def model(self):
+        """The Gemini model, initialized on first use"""
+        if self._model is None:
+            self._initialize_model()
+        return self._model
+    
+    async def _get_model(self):
+        """Get the Gemini model, resolving it off the event loop on first use"""
+        if self._model is None:
+            async with self._model_lock:
+                if self._model is None:
+                    await run_blocking(self._initialize_model)
+        return self._model
+    
+    def is_model_initialized(self) -> bool:
+        """Whether a model has been resolved yet, without resolving one"""
+        return self._model is not None
+    
+    def _initialize_model(self):
+        """Initialize the model with the first available one"""
+        genai = _get_genai()
+        for model_name in self.model_names:
+            try:
+                # Constructing a model never fails for an unavailable name, so check it with a metadata
+                # lookup, which unlike a generation request is not billed
+                model_info = genai.get_model(f"models/{model_name}")
+                if "generateContent" not in model_info.supported_generation_methods:
+                    logger.warning("Gemini model %s does not support content generation", model_name)
+                    continue
+                self._model = genai.GenerativeModel(model_name)
+                logger.info("Successfully initialized Gemini model: %s", model_name)
+                
+                # Log model capabilities
+                if '2.5' in model_name:
+                    logger.info("🚀 Using latest Gemini 2.5 model with enhanced capabilities")
+                elif '2.0' in model_name:
+                    logger.info("⚡ Using Gemini 2.0 model with improved performance")
+                elif '1.5' in model_name:
+                    logger.info("✅ Using stable Gemini 1.5 model")
+                else:
+                    logger.info("📦 Using legacy Gemini model")
+                
+                break
+            except Exception as e:
+                logger.warning("Failed to initialize model %s: %s", model_name, e)
+                continue
+        
+        if self._model is None:
+            # List available models for debugging
+            try:
+                available_models = list(genai.list_models())
+                logger.error("Available models: %s", [model.name for model in available_models])
+            except Exception as e:
+                logger.error("Could not list available models: %s", e)
+            raise Exception("Failed to initialize any Gemini model. Please check your API key and model availability.")
+    
+    def get_current_model_name(self) -> str:
+        """Get the name of the currently initialized model"""
+        return self._model.model_name if self._model else "No model initialized"
+    
+    def _check_api_key(self):
+        """Fail fast when no Gemini API key is configured"""
+        if not settings.GEMINI_API_KEY or settings.GEMINI_API_KEY == "your_gemini_api_key_here":
+            logger.error("Gemini API key not configured")
+            raise Exception("Gemini API key not configured")
+    
+    def _url_cache_key(self, image_url: str) -> tuple:
+        """Key for OCR results cached by document URL"""
+        return (hashlib.sha256(image_url.encode()).digest(), PROMPT_VERSION)
+    
+    def _content_cache_key(self, content: bytes) -> tuple:
+        """Key for OCR results cached by file content"""
+        return (hashlib.sha256(content).hexdigest(), PROMPT_VERSION)
+    
+    async def _download(self, image_url: str) -> bytes:
+        """Download a file from its GCP URL with retry logic"""
+        logger.info("Downloading file from URL: %s", image_url)
+        for attempt in range(MAX_RETRIES):
+            try:
+                file_response = await http_client.get(image_url)
+                file_response.raise_for_status()
+                return file_response.content
+            except httpx.HTTPError as e:
+                if attempt == MAX_RETRIES - 1:
+                    raise Exception(f"Failed to download file after {MAX_RETRIES} attempts: {str(e)}")
+                logger.warning("Download attempt %s failed: %s, retrying...", attempt + 1, e)
+                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+    
+    async def _download_for(self, image_url: str) -> tuple:
+        """Download a file and pair it with its URL (or with the error if the download failed), for consumers that see downloads in completion order"""
+        try:
+            return image_url, await self._download(image_url)
+        except Exception as e:
+            return image_url, e
+    
+    def _file_part(self, image_url: str, content: bytes) -> Dict[str, Any]:
+        """Build the inline file part sent to Gemini"""
+        # Determine MIME type based on file extension, falling back to JPEG
+        mime_type = MIME_TYPES.get(os.path.splitext(image_url)[1].lower(), "image/jpeg")
+        
+        # The SDK takes the raw bytes and encodes them for transport itself
+        return {
+            "mime_type": mime_type,
+            "data": content
+        }
+    
+    def _parse_response(self, response_text: str) -> Dict[str, Any]:
+        """Parse the JSON object in a model response"""
+        # Parse the response with enhanced error handling
+        extracted_text = response_text.strip()
+        logger.info("Raw OCR response: %s...", extracted_text[:500])  # Log first 500 chars
+        
+        # Clean up the response to extract JSON
+        json_text = self._extract_json_from_response(extracted_text)
+        
+        # Parse JSON with validation
+        return self._parse_and_validate_json(json_text)
+    
+    async def extract_paystub_data(self, image_url: str) -> Dict[str, Any]:
+        """Extract structured data from pay stub using Gemini Vision with enhanced processing"""
+        try:
+            logger.info("Extracting data from image URL: %s", image_url)
+            logger.info("Using Gemini model: %s", self.get_current_model_name())
+            self._check_api_key()
             
-            # Post-process the data for better accuracy
-            extracted_data = self._post_process_extracted_data(extracted_data)
+            cache_key = self._url_cache_key(image_url)
+            cached = self._ocr_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Using cached OCR result for %s", image_url)
+                return dict(cached)
             
-            logger.info(f"Successfully extracted data: {extracted_data}")
-            return extracted_data
+            # Concurrent requests for the same document share one download and model call
+            return dict(await self._coalesce(cache_key, lambda: self._download_and_extract(image_url)))
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON from Gemini response: {e}")
+        except orjson.JSONDecodeError as e:
+            logger.error("Error parsing JSON from Gemini response: %s", e)
             raise Exception("Failed to parse OCR results")
         except Exception as e:
-            logger.error(f"Error extracting paystub data: {e}")
+            logger.error("Error extracting paystub data: %s", e)
             raise Exception(f"OCR extraction failed: {str(e)}")
     
+    async def _coalesce(self, key: tuple, extract: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Run an extraction, sharing it with any concurrent caller using the same key"""
+        extract_task = self._inflight_extractions.get(key)
+        if extract_task is None:
+            extract_task = asyncio.ensure_future(extract())
+            self._inflight_extractions[key] = extract_task
+            extract_task.add_done_callback(lambda _: self._inflight_extractions.pop(key, None))
+        
+        # Shielded so one cancelled caller doesn't cancel the extraction for the others
+        return await asyncio.shield(extract_task)
+    
+    async def _download_and_extract(self, image_url: str) -> Dict[str, Any]:
+        """Download a document and run OCR on it unless its content was already processed"""
+        content = await self._download(image_url)
+        
+        # A re-upload of an already processed file skips the model call
+        cached = self._content_cache.get(self._content_cache_key(content))
+        if cached is not None:
+            logger.info("Using cached OCR result for identical content at %s", image_url)
+            self._ocr_cache[self._url_cache_key(image_url)] = cached
+            return cached
+        
+        return await self._extract_downloaded(image_url, content)
+    
+    async def _extract_downloaded(self, image_url: str, content: bytes) -> Dict[str, Any]:
+        """Run OCR on one downloaded document and cache the result"""
+        # The same file under different URLs is only sent to the model once at a time
+        content_key = self._content_cache_key(content)
+        extracted_data = await self._coalesce(content_key, lambda: self._generate_extraction(image_url, content))
+        self._ocr_cache[self._url_cache_key(image_url)] = extracted_data
+        self._content_cache[content_key] = extracted_data
+        return extracted_data
+    
+    async def _generate_text(self, parts: List[Any]) -> str:
+        """Stream a model response with retry logic and return the text of its JSON object"""
+        model = await self._get_model()
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = await model.generate_content_async(parts, stream=True)
+                return await self._collect_json_stream(response)
+            except Exception as e:
+                if attempt == MAX_RETRIES - 1:
+                    raise Exception(f"Failed to process document after {MAX_RETRIES} attempts: {str(e)}")
+                logger.warning("OCR attempt %s failed: %s, retrying...", attempt + 1, e)
+                await asyncio.sleep(2 ** attempt)  # Exponential backoff
+    
+    async def _collect_json_stream(self, response) -> str:
+        """Read a streamed response to the end, keeping the text up to where the first top-level JSON object closes"""
+        chunks = []
+        depth = 0
+        in_string = escaped = complete = False
+        # The stream is always drained, since leaving it unread would keep the request open and the model generating
+        async for chunk in response:
+            if complete:
+                continue
+            text = chunk.text
+            # Track brace depth outside string literals; anything after the object (a closing fence,
+            # trailing remarks) is dropped
+            for index, char in enumerate(text):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"' and depth:
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                elif char == "}" and depth:
+                    depth -= 1
+                    if depth == 0:
+                        text = text[:index + 1]
+                        complete = True
+                        break
+            chunks.append(text)
+        return "".join(chunks)
+    
+    async def _generate_extraction(self, image_url: str, content: bytes) -> Dict[str, Any]:
+        """Send one document to Gemini and return its post-processed fields"""
+        file_part = self._file_part(image_url, content)
+        response_text = await self._generate_text([_paystub_prompt_part(), file_part])
+        extracted_data = self._parse_response(response_text)
+        
+        # Post-process the data for better accuracy
+        extracted_data = self._post_process_extracted_data(extracted_data)
+        
+        logger.info("Successfully extracted data: %s", extracted_data)
+        return extracted_data
+    
+    async def extract_paystub_data_batch(self, image_urls: List[str]) -> List[Union[Dict[str, Any], Exception]]:
+        """Extract pay stub data from several documents, sending up to MAX_OCR_BATCH of them per Gemini request; a failed document comes back as its exception"""
+        try:
+            self._check_api_key()
+        except Exception as e:
+            return [e for _ in image_urls]
+        results: Dict[str, Union[Dict[str, Any], Exception]] = {}
+        
+        to_download = []
+        for image_url in dict.fromkeys(image_urls):
+            cached = self._ocr_cache.get(self._url_cache_key(image_url))
+            if cached is not None:
+                results[image_url] = cached
+            else:
+                to_download.append(image_url)
+        
+        # Download every uncached file concurrently, starting a Gemini request as soon as a full batch
+        # has arrived so inference on earlier documents overlaps the remaining downloads
+        downloads = [asyncio.ensure_future(self._download_for(image_url)) for image_url in to_download]
+        batches = []
+        batch_tasks = []
+        pending = []
+        try:
+            for download in asyncio.as_completed(downloads):
+                image_url, content = await download
+                if isinstance(content, Exception):
+                    results[image_url] = content
+                    continue
+                cached = self._content_cache.get(self._content_cache_key(content))
+                if cached is not None:
+                    self._ocr_cache[self._url_cache_key(image_url)] = cached
+                    results[image_url] = cached
+                    continue
+                pending.append((image_url, content))
+                if len(pending) == MAX_OCR_BATCH:
+                    batches.append(pending)
+                    batch_tasks.append(asyncio.ensure_future(self._extract_batch(pending)))
+                    pending = []
+            if pending:
+                batches.append(pending)
+                batch_tasks.append(asyncio.ensure_future(self._extract_batch(pending)))
+            
+            for batch, batch_results in zip(batches, await asyncio.gather(*batch_tasks, return_exceptions=True)):
+                if isinstance(batch_results, Exception):
+                    batch_results = {image_url: batch_results for image_url, _ in batch}
+                results.update(batch_results)
+        finally:
+            # Nothing is left running if the caller is cancelled
+            for task in downloads + batch_tasks:
+                task.cancel()
+        
+        for image_url, result in results.items():
+            if isinstance(result, Exception):
+                logger.error("Error extracting paystub data from %s: %s", image_url, result)
+        return [result if isinstance(result, Exception) else dict(result) for result in (results[image_url] for image_url in image_urls)]
+    
+    async def _extract_batch(self, batch: List[tuple]) -> Dict[str, Union[Dict[str, Any], Exception]]:
+        """Run one Gemini request for a group of downloaded documents and cache each result; a document that fails maps to its exception"""
+        if len(batch) == 1:
+            # A single document uses the regular prompt and response shape
+            return await self._extract_each(batch)
+        
+        parts = [_paystub_prompt_part(), BATCH_PROMPT.format(count=len(batch))]
+        parts.extend(self._file_part(image_url, content) for image_url, content in batch)
+        
+        try:
+            response_text = await self._generate_text(parts)
+            documents = self._parse_response(response_text).get("documents")
+        except Exception as e:
+            # One unreadable file can fail the whole request, so each document gets a request of its own
+            logger.warning("Batch OCR request failed, extracting its %s documents separately: %s", len(batch), e)
+            return await self._extract_each(batch)
+        by_index = {}
+        if isinstance(documents, list):
+            by_index = {item.pop("index"): item for item in documents if isinstance(item, dict) and "index" in item}
+        # Parse the whole batch's amounts column by column before the per-document clean-up
+        self._normalize_numeric_fields(list(by_index.values()))
+        
+        results = {}
+        missing = []
+        for index, (image_url, content) in enumerate(batch):
+            extracted_data = by_index.get(index)
+            if extracted_data is None:
+                # Fall back to a request of its own for any document the batch response left out
+                logger.warning("Batch OCR response is missing document %s, extracting it separately", index)
+                missing.append((image_url, content))
+                continue
+            extracted_data = self._post_process_extracted_data(extracted_data)
+            self._ocr_cache[self._url_cache_key(image_url)] = extracted_data
+            self._content_cache[self._content_cache_key(content)] = extracted_data
+            results[image_url] = extracted_data
+        if missing:
+            results.update(await self._extract_each(missing))
+        return results
+    
+    async def _extract_each(self, batch: List[tuple]) -> Dict[str, Union[Dict[str, Any], Exception]]:
+        """Extract downloaded documents with a request each, concurrently, mapping any that fail to their exception"""
+        extracted = await asyncio.gather(
+            *(self._extract_downloaded(image_url, content) for image_url, content in batch),
+            return_exceptions=True
+        )
+        return {image_url: result for (image_url, _), result in zip(batch, extracted)}
+    
+    def invalidate_cache(self, content_hash: Optional[str] = None):
+        """Drop cached OCR results for one file's SHA-256 content hash, or all of them"""
+        if content_hash is None:
+            self._ocr_cache.clear()
+            self._content_cache.clear()
+            return
+        
+        stale = [self._content_cache.pop(key) for key in list(self._content_cache) if key[0] == content_hash]
+        # URL entries share the result object with the content entry they were cached alongside
+        for key, cached in list(self._ocr_cache.items()):
+            if any(cached is result for result in stale):
+                del self._ocr_cache[key]
+    
     def _extract_json_from_response(self, response_text: str) -> str:
         """Extract JSON from various response formats"""
         # Try different JSON extraction patterns
-        patterns = [
-            r"```json\s*(.*?)\s*```",
-            r"```\s*(.*?)\s*```",
-            r"\{.*\}",
-        ]
-        
-        import re
-        for pattern in patterns:
-            matches = re.findall(pattern, response_text, re.DOTALL)
-            if matches:
-                return matches[0].strip()
+        for pattern in JSON_PATTERNS:
+            # Only the first match is used, so stop scanning once it is found
+            match = pattern.search(response_text)
+            if match:
+                return (match.group(1) if pattern.groups else match.group(0)).strip()
         
         # If no pattern matches, return the original text
         return response_text
@@ -307,16 +690,16 @@ class GeminiOCRService:
     def _parse_and_validate_json(self, json_text: str) -> Dict[str, Any]:
         """Parse and validate JSON with better error handling"""
         try:
-            extracted_data = json.loads(json_text)
-        except json.JSONDecodeError as e:
+            extracted_data = orjson.loads(json_text)
+        except orjson.JSONDecodeError as e:
             # Try to fix common JSON issues
             json_text = json_text.replace("'", '"')  # Replace single quotes with double quotes
             json_text = json_text.replace("True", "true").replace("False", "false")  # Fix boolean values
             json_text = json_text.replace("None", "null")  # Fix None values
             
             try:
-                extracted_data = json.loads(json_text)
-            except json.JSONDecodeError:
+                extracted_data = orjson.loads(json_text)
+            except orjson.JSONDecodeError:
                 # If still failing, create a minimal valid JSON
                 logger.warning("Failed to parse JSON, creating minimal structure")
                 extracted_data = {
@@ -336,6 +719,20 @@ class GeminiOCRService:
         
         return extracted_data
     
+    def _normalize_numeric_fields(self, rows: List[Dict[str, Any]]):
+        """Parse the numeric fields of a group of extractions to float or None, one field at a time"""
+        for field in NUMERIC_FIELDS:
+            for data in rows:
+                value = data.get(field)
+                # Already parsed (a batch is normalized before each row is post-processed)
+                if value is None or type(value) is float:
+                    continue
+                try:
+                    # Remove currency symbols and commas
+                    data[field] = float(value.translate(AMOUNT_STRIP) if isinstance(value, str) else value)
+                except (ValueError, TypeError):
+                    data[field] = None
+    
     def _post_process_extracted_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Post-process extracted data for better accuracy with enhanced field handling"""
         
@@ -345,7 +742,7 @@ class GeminiOCRService:
             if data.get(field) and isinstance(data[field], str):
                 data[field] = data[field].strip()
                 # Remove common null indicators
-                if data[field] == "" or data[field].lower() in ["null", "none", "n/a", "na", "n/a", "not available", "unknown", "tbd"]:
+                if data[field].lower() in NULL_INDICATORS:
                     data[field] = None
                 # Clean up common formatting issues
                 elif field == "employee_name":
@@ -355,23 +752,12 @@ class GeminiOCRService:
                     # Normalize company name formatting
                     data[field] = data[field].title()
         
-        # Clean up numeric fields with enhanced parsing
-        numeric_fields = ["annual_salary", "gross_pay", "net_pay", "hourly_rate", "hours_worked", "year_to_date_gross", "year_to_date_net"]
-        for field in numeric_fields:
-            if data.get(field):
-                try:
-                    # Remove currency symbols and commas
-                    if isinstance(data[field], str):
-                        cleaned_value = data[field].replace("$", "").replace(",", "").replace("€", "").replace("£", "").replace("¥", "").strip()
-                        data[field] = float(cleaned_value)
-                    else:
-                        data[field] = float(data[field])
-                except (ValueError, TypeError):
-                    data[field] = None
+        # Clean up numeric fields with enhanced parsing; afterwards each one is a float or None
+        self._normalize_numeric_fields([data])
         
         # Enhanced SSN processing
         if data.get("ssn") and isinstance(data["ssn"], str):
-            ssn = data["ssn"].replace("-", "").replace(" ", "").replace("_", "")
+            ssn = data["ssn"].translate(SSN_STRIP)
             # Handle different SSN formats
             if len(ssn) >= 4:
                 data["ssn"] = ssn[-4:]  # Last 4 digits only
@@ -380,57 +766,41 @@ class GeminiOCRService:
             else:
                 data["ssn"] = None
         
-        # Enhanced annual salary calculation with multiple fallback strategies
+        # Enhanced annual salary calculation with multiple fallback strategies; numeric fields are already
+        # floats or None, so each strategy only checks presence and nothing here can raise
         if not data.get("annual_salary"):
-            try:
-                # Strategy 1: Use gross_pay with pay_period
-                if data.get("gross_pay") and data.get("pay_period"):
-                    gross_pay = float(data["gross_pay"])
-                    pay_period = data["pay_period"].lower()
-                    
-                    if "weekly" in pay_period or "week" in pay_period:
-                        data["annual_salary"] = gross_pay * 52
-                    elif "bi-weekly" in pay_period or "biweekly" in pay_period or "bi weekly" in pay_period:
-                        data["annual_salary"] = gross_pay * 26
-                    elif "semi-monthly" in pay_period or "semi monthly" in pay_period:
-                        data["annual_salary"] = gross_pay * 24
-                    elif "monthly" in pay_period or "month" in pay_period:
-                        data["annual_salary"] = gross_pay * 12
-                    elif "daily" in pay_period or "day" in pay_period:
-                        data["annual_salary"] = gross_pay * 260  # Assuming 5 days/week, 52 weeks/year
-                
-                # Strategy 2: Assume monthly if gross_pay is provided but no pay_period
-                elif data.get("gross_pay") and not data.get("pay_period"):
-                    gross_pay = float(data["gross_pay"])
-                    # If gross_pay is reasonable for monthly (between 1000-500000), assume monthly
-                    if 1000 <= gross_pay <= 500000:
-                        data["annual_salary"] = gross_pay * 12
-                
-                # Strategy 3: Use net_pay as fallback with monthly assumption
-                elif data.get("net_pay") and not data.get("gross_pay"):
-                    net_pay = float(data["net_pay"])
-                    # If net_pay is reasonable for monthly (between 1000-500000), assume monthly
-                    if 1000 <= net_pay <= 500000:
-                        data["annual_salary"] = net_pay * 12
-                
-                # Strategy 4: Use year_to_date_gross to calculate annual
-                elif data.get("year_to_date_gross"):
-                    ytd_gross = float(data["year_to_date_gross"])
-                    # Estimate based on current month (assuming we're in March, so multiply by 4)
-                    data["annual_salary"] = ytd_gross * 4
-                    
-            except (ValueError, TypeError):
-                pass  # Keep annual_salary as None if calculation fails
+            gross_pay = data.get("gross_pay")
+            pay_period = data.get("pay_period")
+            net_pay = data.get("net_pay")
+            ytd_gross = data.get("year_to_date_gross")
+            
+            # Strategy 1: Use gross_pay with pay_period
+            if gross_pay is not None and pay_period:
+                period = PAY_PERIOD_RE.search(pay_period) if isinstance(pay_period, str) else None
+                if period:
+                    data["annual_salary"] = gross_pay * PAY_PERIODS_PER_YEAR[period.lastgroup]
+            
+            # Strategy 2: Assume monthly if gross_pay is provided but no pay_period
+            elif gross_pay is not None:
+                # If gross_pay is reasonable for monthly (between 1000-500000), assume monthly
+                if 1000 <= gross_pay <= 500000:
+                    data["annual_salary"] = gross_pay * 12
+            
+            # Strategy 3: Use net_pay as fallback with monthly assumption
+            elif net_pay is not None:
+                # If net_pay is reasonable for monthly (between 1000-500000), assume monthly
+                if 1000 <= net_pay <= 500000:
+                    data["annual_salary"] = net_pay * 12
+            
+            # Strategy 4: Use year_to_date_gross to calculate annual
+            elif ytd_gross is not None:
+                # Estimate based on current month (assuming we're in March, so multiply by 4)
+                data["annual_salary"] = ytd_gross * 4
         
         # Enhanced hourly rate calculation if not directly provided
-        if not data.get("hourly_rate") and data.get("gross_pay") and data.get("hours_worked"):
-            try:
-                gross_pay = float(data["gross_pay"])
-                hours_worked = float(data["hours_worked"])
-                if hours_worked > 0:
-                    data["hourly_rate"] = gross_pay / hours_worked
-            except (ValueError, TypeError, ZeroDivisionError):
-                pass  # Keep hourly_rate as None if calculation fails
+        if data.get("hourly_rate") is None and data.get("gross_pay") is not None and data.get("hours_worked"):
+            if data["hours_worked"] > 0:
+                data["hourly_rate"] = data["gross_pay"] / data["hours_worked"]
         
         # Clean up deductions field
         if data.get("deductions") and isinstance(data["deductions"], str):
@@ -441,88 +811,32 @@ class GeminiOCRService:
         # Validate and clean pay_date
         if data.get("pay_date") and isinstance(data["pay_date"], str):
             try:
-                from datetime import datetime
-                # Try to parse various date formats
-                date_formats = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d", "%m-%d-%Y", "%d-%m-%Y"]
-                parsed_date = None
-                for fmt in date_formats:
-                    try:
-                        parsed_date = datetime.strptime(data["pay_date"], fmt)
-                        break
-                    except ValueError:
-                        continue
-                
-                if parsed_date:
-                    data["pay_date"] = parsed_date.strftime("%Y-%m-%d")
-                else:
-                    data["pay_date"] = None
-            except (ValueError, TypeError):
-                data["pay_date"] = None
+                # The prompt asks for YYYY-MM-DD, so that format is checked first without the general parser
+                parsed_date = date.fromisoformat(data["pay_date"])
+            except ValueError:
+                try:
+                    # Any other layout, including written-out dates like "March 31, 2024"; missing parts default to the 1st
+                    parsed_date = date_parser.parse(data["pay_date"], default=PAY_DATE_DEFAULT)
+                except (ValueError, OverflowError):
+                    parsed_date = None
+                # Text without a year, such as "15th" or "March", is not a usable pay date
+                if parsed_date and parsed_date.year == PAY_DATE_DEFAULT.year:
+                    parsed_date = None
+            data["pay_date"] = parsed_date.strftime("%Y-%m-%d") if parsed_date else None
         
         return data
     
+    def _normalize_text(self, value: Any) -> str:
+        """Lowercase and strip a compared text field, treating a missing value as empty"""
+        return str(value).lower().strip() if value else ""
+    
     def _calculate_name_similarity(self, name1: str, name2: str) -> float:
-        """Calculate similarity between two names using multiple algorithms"""
-        if not name1 or not name2:
-            return 0.0
-        
-        # Normalize names
-        name1 = name1.lower().strip()
-        name2 = name2.lower().strip()
-        
-        if name1 == name2:
-            return 1.0
-        
-        # Split into words
-        words1 = set(name1.split())
-        words2 = set(name2.split())
-        
-        if not words1 or not words2:
-            return 0.0
-        
-        # Calculate Jaccard similarity
-        intersection = len(words1.intersection(words2))
-        union = len(words1.union(words2))
-        jaccard_sim = intersection / union if union > 0 else 0.0
-        
-        # Calculate word order similarity
-        words1_list = name1.split()
-        words2_list = name2.split()
-        
-        # Check if all words from shorter name are in longer name
-        if len(words1_list) <= len(words2_list):
-            shorter, longer = words1_list, words2_list
-        else:
-            shorter, longer = words2_list, words1_list
-        
-        word_order_sim = sum(1 for word in shorter if word in longer) / len(shorter) if shorter else 0.0
-        
-        # Combine similarities (weighted average)
-        combined_sim = (jaccard_sim * 0.6) + (word_order_sim * 0.4)
-        
-        return min(combined_sim, 1.0)
+        """Calculate similarity between two normalized names as a 0-1 fuzzy match score"""
+        return _name_similarity(name1, name2)
     
     def _calculate_employer_similarity(self, employer1: str, employer2: str) -> float:
-        """Calculate similarity between two employer names"""
-        if not employer1 or not employer2:
-            return 0.0
-        
-        # Normalize employer names
-        employer1 = employer1.lower().strip()
-        employer2 = employer2.lower().strip()
-        
-        if employer1 == employer2:
-            return 1.0
-        
-        # Remove common business suffixes
-        suffixes = ['inc', 'llc', 'corp', 'ltd', 'company', 'co', 'enterprises', 'group']
-        
-        for suffix in suffixes:
-            employer1 = employer1.replace(f' {suffix}', '').replace(f'.{suffix}', '')
-            employer2 = employer2.replace(f' {suffix}', '').replace(f'.{suffix}', '')
-        
-        # Use name similarity calculation
-        return self._calculate_name_similarity(employer1, employer2)
+        """Calculate similarity between two normalized employer names"""
+        return _employer_similarity(employer1, employer2)
     
     def _calculate_overall_verification_status(self, verification_results: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate overall verification status - ANY mismatch results in overall mismatch"""
@@ -532,41 +846,16 @@ class GeminiOCRService:
         mismatches = []
         verified_fields = []
         
-        # Check name match
-        if verification_results.get("name_match") is not None:
-            if verification_results["name_match"]:
-                verification_details.append("✓ Name Match")
-                verified_fields.append("name")
-            else:
-                verification_details.append("✗ Name Mismatch")
-                mismatches.append("name")
-        
-        # Check salary match
-        if verification_results.get("salary_match") is not None:
-            if verification_results["salary_match"]:
-                verification_details.append("✓ Salary Match")
-                verified_fields.append("salary")
-            else:
-                verification_details.append("✗ Salary Mismatch")
-                mismatches.append("salary")
-        
-        # Check employer match
-        if verification_results.get("employer_match") is not None:
-            if verification_results["employer_match"]:
-                verification_details.append("✓ Employer Match")
-                verified_fields.append("employer")
-            else:
-                verification_details.append("✗ Employer Mismatch")
-                mismatches.append("employer")
-        
-        # Check SSN match
-        if verification_results.get("ssn_match") is not None:
-            if verification_results["ssn_match"]:
-                verification_details.append("✓ SSN Match")
-                verified_fields.append("ssn")
+        for field, match_key in VERIFIED_FIELDS:
+            matched = verification_results.get(match_key)
+            if matched is None:
+                continue
+            if matched:
+                verification_details.append(MATCH_DETAILS[field])
+                verified_fields.append(field)
             else:
-                verification_details.append("✗ SSN Mismatch")
-                mismatches.append("ssn")
+                verification_details.append(MISMATCH_DETAILS[field])
+                mismatches.append(field)
         
         # Calculate percentage score
         total_fields = len(verified_fields) + len(mismatches)
@@ -593,137 +882,205 @@ class GeminiOCRService:
         
         return verification_results
     
-    async def verify_application_data(self, application_data: Dict[str, Any], extracted_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Compare application data with extracted OCR data"""
-        try:
-            logger.info(f"Verifying application data: {application_data}")
-            logger.info(f"Against extracted data: {extracted_data}")
-            if not settings.GEMINI_API_KEY or settings.GEMINI_API_KEY == "your_gemini_api_key_here":
-                logger.error("Gemini API key not configured")
-                raise Exception("Gemini API key not configured")
-            
-            verification_results = {
+    def _verify_name(self, application_data: Dict[str, Any], extracted_data: Dict[str, Any], normalized: Dict[str, str]) -> Dict[str, Any]:
+        """Verify name with strict 80% similarity threshold"""
+        app_name = normalized["name"]
+        extracted_name = normalized["employee_name"]
+        raw_app_name = application_data.get("name")
+        raw_extracted_name = extracted_data.get("employee_name")
+        
+        if app_name and extracted_name:
+            name_match_score = self._calculate_name_similarity(app_name, extracted_name)
+            if name_match_score >= 0.8:  # Strict 80% similarity threshold
+                return {
+                    "name_match": True,
+                    "name_reason": f"Name matches (similarity: {name_match_score:.1%})"
+                }
+            return {
                 "name_match": False,
-                "name_reason": "",
+                "name_reason": f"Name mismatch: Application has '{raw_app_name}' but pay stub shows '{raw_extracted_name}' (similarity: {name_match_score:.1%}) - requires 80%+ similarity"
+            }
+        return {
+            "name_match": False,
+            "name_reason": "Could not verify name - missing data"
+        }
+    
+    def _salary_tolerance(self, app_salary: float) -> int:
+        """Allowed salary difference in percent, based on the application salary range"""
+        return SALARY_TOLERANCES[bisect_right(SALARY_TOLERANCE_BOUNDS, app_salary)]
+    
+    def _verify_salary(self, application_data: Dict[str, Any], extracted_data: Dict[str, Any], normalized: Dict[str, Any]) -> Dict[str, Any]:
+        """Verify salary within a tolerance that depends on the salary range"""
+        app_salary = application_data.get("annual_salary", 0)
+        extracted_salary = extracted_data.get("annual_salary", 0)
+        
+        if extracted_salary and app_salary:
+            # Calculate salary difference and percentage
+            salary_diff = abs(app_salary - extracted_salary)
+            salary_diff_percent = (salary_diff / app_salary) * 100 if app_salary > 0 else 100
+            tolerance_percent = normalized["salary_tolerance"]
+            
+            if salary_diff_percent <= tolerance_percent:
+                return {
+                    "salary_match": True,
+                    "salary_reason": f"Salary matches within {tolerance_percent}% tolerance (difference: ${salary_diff:,}, {salary_diff_percent:.1f}%)",
+                    "extracted_salary": extracted_salary
+                }
+            return {
                 "salary_match": False,
-                "salary_reason": "",
-                "extracted_salary": None,
+                "salary_reason": f"Salary mismatch: Application shows ${app_salary:,} but pay stub indicates ${extracted_salary:,} (difference: ${salary_diff:,}, {salary_diff_percent:.1f}%)",
+                "extracted_salary": extracted_salary
+            }
+        elif extracted_salary:
+            return {
+                "salary_match": False,
+                "salary_reason": "Could not verify salary - application salary not provided",
+                "extracted_salary": extracted_salary
+            }
+        return {
+            "salary_match": False,
+            "salary_reason": "Could not extract salary from pay stub",
+            "extracted_salary": None
+        }
+    
+    def _verify_employer(self, application_data: Dict[str, Any], extracted_data: Dict[str, Any], normalized: Dict[str, str]) -> Dict[str, Any]:
+        """Verify employer with strict 80% similarity threshold"""
+        app_employer = normalized["employer_name"]
+        extracted_employer = normalized["company_name"]
+        raw_extracted_employer = extracted_data.get("company_name")
+        
+        if not extracted_employer:
+            return {
                 "employer_match": False,
-                "employer_reason": "",
-                "extracted_employer": None,
+                "employer_reason": "Could not extract employer name from pay stub",
+                "extracted_employer": None
+            }
+        if not app_employer:
+            return {
+                "employer_match": False,
+                "employer_reason": "Could not verify employer - missing data",
+                "extracted_employer": raw_extracted_employer
+            }
+        
+        employer_match_score = self._calculate_employer_similarity(app_employer, extracted_employer)
+        if employer_match_score >= 0.8:  # Strict 80% similarity threshold
+            return {
+                "employer_match": True,
+                "employer_reason": f"Employer matches (similarity: {employer_match_score:.1%})",
+                "extracted_employer": raw_extracted_employer
+            }
+        return {
+            "employer_match": False,
+            "employer_reason": f"Employer mismatch: Application has '{application_data.get('employer_name')}' but pay stub shows '{raw_extracted_employer}' (similarity: {employer_match_score:.1%}) - requires 80%+ similarity",
+            "extracted_employer": raw_extracted_employer
+        }
+    
+    def _verify_ssn(self, application_data: Dict[str, Any], extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Verify SSN (last 4 digits) - exact match required"""
+        app_ssn = application_data.get("ssn", "")
+        extracted_ssn = extracted_data.get("ssn", "")
+        
+        if not extracted_ssn:
+            return {
                 "ssn_match": False,
-                "ssn_reason": "",
+                "ssn_reason": "Could not extract SSN from pay stub",
                 "extracted_ssn": None
             }
-            
-            # Verify name with strict 80% similarity threshold
-            app_name = application_data.get("name", "").lower().strip()
-            extracted_name = extracted_data.get("employee_name", "").lower().strip()
-            
-            if app_name and extracted_name:
-                name_match_score = self._calculate_name_similarity(app_name, extracted_name)
-                if name_match_score >= 0.8:  # Strict 80% similarity threshold
-                    verification_results["name_match"] = True
-                    verification_results["name_reason"] = f"Name matches (similarity: {name_match_score:.1%})"
-                else:
-                    verification_results["name_match"] = False
-                    verification_results["name_reason"] = f"Name mismatch: Application has '{application_data.get('name')}' but pay stub shows '{extracted_data.get('employee_name')}' (similarity: {name_match_score:.1%}) - requires 80%+ similarity"
-            else:
-                verification_results["name_match"] = False
-                verification_results["name_reason"] = "Could not verify name - missing data"
-            
-            # Verify salary with enhanced logic
-            app_salary = application_data.get("annual_salary", 0)
-            extracted_salary = extracted_data.get("annual_salary", 0)
-            
-            if extracted_salary and app_salary:
-                verification_results["extracted_salary"] = extracted_salary
-                
-                # Calculate salary difference and percentage
-                salary_diff = abs(app_salary - extracted_salary)
-                salary_diff_percent = (salary_diff / app_salary) * 100 if app_salary > 0 else 100
-                
-                # Dynamic tolerance based on salary range (more flexible)
-                if app_salary < 30000:
-                    tolerance_percent = 15  # 15% for low salaries (increased from 10%)
-                elif app_salary < 100000:
-                    tolerance_percent = 12  # 12% for medium salaries (increased from 7%)
-                else:
-                    tolerance_percent = 10  # 10% for high salaries (increased from 5%)
-                
-                if salary_diff_percent <= tolerance_percent:
-                    verification_results["salary_match"] = True
-                    verification_results["salary_reason"] = f"Salary matches within {tolerance_percent}% tolerance (difference: ${salary_diff:,}, {salary_diff_percent:.1f}%)"
-                else:
-                    verification_results["salary_reason"] = f"Salary mismatch: Application shows ${app_salary:,} but pay stub indicates ${extracted_salary:,} (difference: ${salary_diff:,}, {salary_diff_percent:.1f}%)"
-            elif extracted_salary:
-                verification_results["extracted_salary"] = extracted_salary
-                verification_results["salary_reason"] = "Could not verify salary - application salary not provided"
-            else:
-                verification_results["salary_reason"] = "Could not extract salary from pay stub"
-            
-            # Verify employer with strict 80% similarity threshold
-            app_employer = application_data.get("employer_name", "").lower().strip()
-            extracted_employer = extracted_data.get("company_name", "").lower().strip()
-            
-            if extracted_employer:
-                verification_results["extracted_employer"] = extracted_data.get("company_name")
-                if app_employer and extracted_employer:
-                    employer_match_score = self._calculate_employer_similarity(app_employer, extracted_employer)
-                    if employer_match_score >= 0.8:  # Strict 80% similarity threshold
-                        verification_results["employer_match"] = True
-                        verification_results["employer_reason"] = f"Employer matches (similarity: {employer_match_score:.1%})"
-                    else:
-                        verification_results["employer_match"] = False
-                        verification_results["employer_reason"] = f"Employer mismatch: Application has '{application_data.get('employer_name')}' but pay stub shows '{extracted_data.get('company_name')}' (similarity: {employer_match_score:.1%}) - requires 80%+ similarity"
-                else:
-                    verification_results["employer_match"] = False
-                    verification_results["employer_reason"] = "Could not verify employer - missing data"
-            else:
-                verification_results["employer_match"] = False
-                verification_results["employer_reason"] = "Could not extract employer name from pay stub"
-            
-            # Verify SSN (last 4 digits) - exact match required
-            app_ssn = application_data.get("ssn", "")
-            extracted_ssn = extracted_data.get("ssn", "")
-            
-            if extracted_ssn:
-                verification_results["extracted_ssn"] = extracted_ssn
-                if app_ssn and extracted_ssn:
-                    # Compare last 4 digits - exact match required
-                    app_last4 = app_ssn[-4:] if len(app_ssn) >= 4 else app_ssn
-                    if app_last4 == extracted_ssn:
-                        verification_results["ssn_match"] = True
-                        verification_results["ssn_reason"] = "SSN last 4 digits match"
-                    else:
-                        verification_results["ssn_match"] = False
-                        verification_results["ssn_reason"] = f"SSN mismatch: Application last 4 digits are {app_last4} but pay stub shows {extracted_ssn} - exact match required"
-                else:
-                    verification_results["ssn_match"] = False
-                    verification_results["ssn_reason"] = "Could not verify SSN - missing data"
-            else:
-                verification_results["ssn_match"] = False
-                verification_results["ssn_reason"] = "Could not extract SSN from pay stub"
-            
-            # Determine overall status with intelligent scoring
-            verification_results = self._calculate_overall_verification_status(verification_results)
-            
-            return verification_results
-            
-        except Exception as e:
-            logger.error(f"Error in verification: {e}")
+        if not app_ssn:
             return {
-                "name_match": False,
-                "name_reason": f"Verification error: {str(e)}",
-                "salary_match": False,
-                "salary_reason": f"Verification error: {str(e)}",
-                "extracted_salary": None,
-                "employer_match": False,
-                "employer_reason": f"Verification error: {str(e)}",
                 "ssn_match": False,
-                "ssn_reason": f"Verification error: {str(e)}",
-                "overall_status": "error"
+                "ssn_reason": "Could not verify SSN - missing data",
+                "extracted_ssn": extracted_ssn
+            }
+        
+        # Compare digits only, so dashes or spaces left by OCR or typed into the application can't cause a mismatch
+        app_last4 = NON_DIGIT_RE.sub("", str(app_ssn))[-4:]
+        extracted_last4 = NON_DIGIT_RE.sub("", str(extracted_ssn))[-4:]
+        
+        # Compare last 4 digits - exact match required
+        if len(app_last4) == 4 and app_last4 == extracted_last4:
+            return {
+                "ssn_match": True,
+                "ssn_reason": "SSN last 4 digits match",
+                "extracted_ssn": extracted_ssn
             }
+        return {
+            "ssn_match": False,
+            "ssn_reason": f"SSN mismatch: Application last 4 digits are {app_last4} but pay stub shows {extracted_ssn} - exact match required",
+            "extracted_ssn": extracted_ssn
+        }
+    
+    def _normalize_application(self, application_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Lowercase and strip the compared application fields and pick the salary tolerance"""
+        app_salary = application_data.get("annual_salary")
+        return {
+            "name": self._normalize_text(application_data.get("name")),
+            "employer_name": self._normalize_text(application_data.get("employer_name")),
+            "salary_tolerance": self._salary_tolerance(app_salary) if app_salary else None
+        }
+    
+    def _verify_extracted(self, application_data: Dict[str, Any], normalized_application: Dict[str, Any], extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Run every field check for one pay stub against already-normalized application fields"""
+        # Lowercase and strip each compared text field once, for both the checks and the similarity scores
+        normalized = {
+            **normalized_application,
+            "employee_name": self._normalize_text(extracted_data.get("employee_name")),
+            "company_name": self._normalize_text(extracted_data.get("company_name"))
+        }
+        
+        # Each field check is local CPU work, so they run in sequence rather than as concurrent tasks;
+        # the name check's dict becomes the result and the others are merged into it in place
+        verification_results = self._verify_name(application_data, extracted_data, normalized)
+        verification_results.update(self._verify_salary(application_data, extracted_data, normalized))
+        verification_results.update(self._verify_employer(application_data, extracted_data, normalized))
+        verification_results.update(self._verify_ssn(application_data, extracted_data))
+        
+        # Determine overall status with intelligent scoring
+        return self._calculate_overall_verification_status(verification_results)
+    
+    def _verification_error(self, message: str) -> Dict[str, Any]:
+        """Result recorded when a pay stub cannot be verified"""
+        reason = f"Verification error: {message}"
+        return {
+            "name_match": False,
+            "name_reason": reason,
+            "salary_match": False,
+            "salary_reason": reason,
+            "extracted_salary": None,
+            "employer_match": False,
+            "employer_reason": reason,
+            "ssn_match": False,
+            "ssn_reason": reason,
+            "overall_status": "error"
+        }
+    
+    async def verify_application_data(self, application_data: Dict[str, Any], extracted_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Compare application data with extracted OCR data"""
+        return (await self.verify_application_data_batch(application_data, [extracted_data]))[0]
+    
+    async def verify_application_data_batch(self, application_data: Dict[str, Any], extracted_rows: List[Union[Dict[str, Any], Exception]]) -> List[Dict[str, Any]]:
+        """Compare one application with the extracted data of each of its pay stubs, in order; a failed extraction becomes an error result"""
+        logger.info("Verifying application data: %s", application_data)
+        logger.info("Against extracted data: %s", extracted_rows)
+        if not settings.GEMINI_API_KEY or settings.GEMINI_API_KEY == "your_gemini_api_key_here":
+            logger.error("Gemini API key not configured")
+            return [self._verification_error("Gemini API key not configured") for _ in extracted_rows]
+        
+        # The application side, including its salary tolerance, is the same for every pay stub, so it is prepared once per batch
+        normalized_application = self._normalize_application(application_data)
+        
+        results = []
+        for extracted_data in extracted_rows:
+            if isinstance(extracted_data, Exception):
+                results.append(self._verification_error(f"OCR extraction failed: {extracted_data}"))
+                continue
+            try:
+                results.append(self._verify_extracted(application_data, normalized_application, extracted_data))
+            except (TypeError, ValueError) as e:
+                # Extracted values of an unexpected type (e.g. a salary the model returned as text) fail only their own row
+                logger.error("Error in verification: %s", e)
+                results.append(self._verification_error(str(e)))
+        return results
 
 # Global instance
 gemini_ocr = GeminiOCRService()
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import logging
 
 from app.routers import applications, auth, documents, verification, stats
 from app.core.config import settings
+from app.core.executor import shutdown_blocking_executor
+from app.core.http import close_http_client
+from app.services.firestore_service import firestore_service
+from app.services.gcp_service import gcp_service
+from app.services.gemini_service import gemini_ocr
 
 # Load environment variables
 load_dotenv()
@@ -15,11 +23,23 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the shared Google Cloud clients on startup and release shared resources on shutdown"""
+    # The Gemini SDK and model are left to load on the first OCR request
+    await asyncio.gather(firestore_service.warmup(), gcp_service.warmup())
+    yield
+    await close_http_client()
+    await firestore_service.close_listeners()
+    shutdown_blocking_executor()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="OCR Loan Verification API",
     description="API for loan application verification using OCR and AI",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -29,6 +49,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Security
@@ -48,8 +69,8 @@ async def root():
 @app.get("/health")
 async def health_check():
     try:
-        from app.services.gemini_service import gemini_ocr
-        model_status = "connected" if gemini_ocr.model else "disconnected"
+        # Reported without resolving the model, which would make metadata requests from the health check
+        model_status = "connected" if gemini_ocr.is_model_initialized() else "not initialized"
         model_name = gemini_ocr.get_current_model_name()
         
         return {
@@ -69,4 +90,5 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # An import string lets uvicorn start several workers (set WEB_CONCURRENCY); uvloop and httptools come with uvicorn[standard]
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
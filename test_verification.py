@@ -0,0 +1,127 @@
+"""
+Regression tests for the field normalization and matching used by verification
+"""
+
+import pytest
+
+from app.services.gemini_service import gemini_ocr
+
+
+def _name_score(name1, name2):
+    return gemini_ocr._calculate_name_similarity(gemini_ocr._normalize_text(name1), gemini_ocr._normalize_text(name2))
+
+
+@pytest.mark.parametrize("name1, name2", [
+    ("John Smith", "John Smith"),
+    ("John Smith", "smith john"),
+    ("  JOHN SMITH ", "John Smith"),
+    ("John A Smith", "John Smith"),
+])
+def test_same_person_matches(name1, name2):
+    assert _name_score(name1, name2) >= 0.8
+
+
+@pytest.mark.parametrize("name1, name2", [
+    ("Mary Smith", "Mark Smith"),
+    ("Jon Smith", "Jan Smith"),
+    ("John Smith", "John Smithson"),
+    ("John Smith", "John"),
+    ("John Smith", ""),
+])
+def test_different_person_does_not_match(name1, name2):
+    assert _name_score(name1, name2) < 0.8
+
+
+def _employer_score(employer1, employer2):
+    return gemini_ocr._calculate_employer_similarity(gemini_ocr._normalize_text(employer1), gemini_ocr._normalize_text(employer2))
+
+
+@pytest.mark.parametrize("employer1, employer2", [
+    ("Zylker Technologies", "Zylker Technologies"),
+    ("Acme Inc", "Acme"),
+    ("Acme Corp", "ACME LLC"),
+    ("Globex Group", "globex"),
+])
+def test_same_employer_matches(employer1, employer2):
+    assert _employer_score(employer1, employer2) >= 0.8
+
+
+@pytest.mark.parametrize("employer1, employer2", [
+    ("Apple", "Applebees"),
+    ("Bank", "Bank of America"),
+    ("Acme", "Acme Fraud Holdings"),
+    ("Acme Commerce", "Acme"),
+])
+def test_different_employer_does_not_match(employer1, employer2):
+    assert _employer_score(employer1, employer2) < 0.8
+
+
+def _pay_date(value):
+    return gemini_ocr._post_process_extracted_data({"pay_date": value})["pay_date"]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("2024-03-31", "2024-03-31"),
+    ("March 31, 2024", "2024-03-31"),
+    ("03/31/2024", "2024-03-31"),
+    ("March 2024", "2024-03-01"),
+])
+def test_pay_date_is_normalized(value, expected):
+    assert _pay_date(value) == expected
+
+
+@pytest.mark.parametrize("value", ["15th", "March", "Paid on the 15th", "N/A", "not a date"])
+def test_pay_date_without_a_year_is_rejected(value):
+    assert _pay_date(value) is None
+
+
+@pytest.mark.parametrize("pay_period, expected", [
+    ("Bi-Weekly", 52000),
+    ("biweekly", 52000),
+    ("Bi Weekly Pay", 52000),
+    ("Weekly", 104000),
+    ("Semi-Monthly", 48000),
+    ("Monthly", 24000),
+])
+def test_annual_salary_from_pay_period(pay_period, expected):
+    data = gemini_ocr._post_process_extracted_data({"gross_pay": "2,000", "pay_period": pay_period})
+    assert data["annual_salary"] == expected
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("$4,000.50", 4000.5),
+    ("₹ 1,23,456", 123456),
+    ("€ 2 500", 2500),
+    ("£1,000", 1000),
+])
+def test_amounts_drop_currency_symbols_and_separators(value, expected):
+    assert gemini_ocr._post_process_extracted_data({"gross_pay": value})["gross_pay"] == expected
+
+
+@pytest.mark.parametrize("app_ssn, extracted_ssn", [
+    ("123-45-6789", "6789"),
+    ("123456789", "***-**-6789"),
+    ("123 45 6789", "XXX-XX-6789"),
+])
+def test_ssn_last_four_digits_match(app_ssn, extracted_ssn):
+    assert gemini_ocr._verify_ssn({"ssn": app_ssn}, {"ssn": extracted_ssn})["ssn_match"]
+
+
+@pytest.mark.parametrize("app_ssn, extracted_ssn", [
+    ("123-45-6789", "1234"),
+    ("789", "6789"),
+    ("123-45-6789", "***-**-789"),
+])
+def test_ssn_last_four_digits_mismatch(app_ssn, extracted_ssn):
+    assert not gemini_ocr._verify_ssn({"ssn": app_ssn}, {"ssn": extracted_ssn})["ssn_match"]
+
+
+@pytest.mark.parametrize("app_salary, expected", [
+    (29999.99, 15),
+    (30000, 12),
+    (99999.99, 12),
+    (100000, 10),
+    (250000, 10),
+])
+def test_salary_tolerance_bounds(app_salary, expected):
+    assert gemini_ocr._salary_tolerance(app_salary) == expected